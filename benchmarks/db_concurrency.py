@@ -0,0 +1,96 @@
+"""
+Throughput of the contact list query under concurrent load, old sync Session path against AsyncSession.
+
+Both variants run the same query from coroutines on one event loop, the way the route handlers do.
+The sync variant blocks the loop for every query, the async one yields to it while waiting on the database.
+
+Usage:
+    python -m benchmarks.db_concurrency --concurrency 50 --requests 2000 --user-id 1
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.conf.config import settings
+from src.database.db import async_database_url
+from src.database.models import Contact
+
+
+def _query(user_id: int, limit: int):
+    return select(Contact).where(Contact.user_id == user_id).order_by(Contact.id).limit(limit)
+
+
+async def run_sync(url: str, user_id: int, limit: int, concurrency: int, requests: int) -> list[float]:
+    engine = create_engine(url, pool_size=concurrency)
+    SessionLocal = sessionmaker(bind=engine)
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            with SessionLocal() as db:
+                db.execute(_query(user_id, limit)).scalars().all()
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    engine.dispose()
+    return latencies
+
+
+async def run_async(url: str, user_id: int, limit: int, concurrency: int, requests: int) -> list[float]:
+    engine = create_async_engine(async_database_url(url), pool_size=concurrency)
+    SessionLocal = async_sessionmaker(bind=engine)
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            async with SessionLocal() as db:
+                (await db.execute(_query(user_id, limit))).scalars().all()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await engine.dispose()
+    return latencies
+
+
+def report(name: str, latencies: list[float], elapsed: float):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{name:>5}: {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=settings.sqlalchemy_database_url)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, runner in (("sync", run_sync), ("async", run_async)):
+        start = time.perf_counter()
+        latencies = await runner(args.url, args.user_id, args.limit, args.concurrency, args.requests)
+        report(name, latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""
+Refresh throughput, refresh token kept on the user row against rotation families in the token store.
+
+The database variant does what the refresh route used to do: load the user, compare the stored token,
+issue new tokens and write the new refresh token back with a commit. The store variant rotates the token
+with src.services.refresh_tokens and never touches the database. Pass --store redis to rotate through the
+configured redis instead of the in-process store.
+
+Usage:
+    python -m benchmarks.refresh_throughput --requests 2000 --email deadpool@example.com [--store redis]
+"""
+import argparse
+import asyncio
+import time
+
+from src.database.db import SessionLocal
+from src.repository import users as repository_users
+from src.services.auth import auth_service
+from src.services.refresh_tokens import STORES, RefreshTokens
+
+
+async def refresh_with_database(email: str, requests: int) -> float:
+    token = await auth_service.create_refresh_token(data={"sub": email})
+    async with SessionLocal() as db:
+        user = await repository_users.get_user_by_email(email, db)
+        user.refresh_token = token
+        await db.commit()
+    start = time.perf_counter()
+    for _ in range(requests):
+        async with SessionLocal() as db:
+            claims = await auth_service.decode_refresh_token(token)
+            user = await repository_users.get_user_by_email(claims["sub"], db)
+            assert user.refresh_token == token
+            await auth_service.create_access_token(data={"sub": email})
+            token = await auth_service.create_refresh_token(data={"sub": email, "n": _})
+            user.refresh_token = token
+            await db.commit()
+    return requests / (time.perf_counter() - start)
+
+
+async def refresh_with_store(email: str, requests: int, store: str) -> float:
+    refresh_tokens = RefreshTokens(STORES[store](), 3600)
+    _, token = await refresh_tokens.start(email)
+    start = time.perf_counter()
+    for _ in range(requests):
+        email, _, token = await refresh_tokens.rotate(token)
+        await auth_service.create_access_token(data={"sub": email})
+    return requests / (time.perf_counter() - start)
+
+
+async def main(email: str, requests: int, store: str):
+    database = await refresh_with_database(email, requests)
+    rotated = await refresh_with_store(email, requests, store)
+    print(f"{'database':>10} {database:>10.1f} refresh/s")
+    print(f"{store:>10} {rotated:>10.1f} refresh/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", required=True, help="Email of an existing user")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--store", choices=sorted(STORES), default="memory")
+    args = parser.parse_args()
+    asyncio.run(main(args.email, args.requests, args.store))
@@ -0,0 +1,77 @@
+"""
+Requests per second of the contact list response, old response_model path against the orjson row path.
+
+The old handler returns ORM objects and lets FastAPI validate them into List[ResponseContact] and
+encode them with jsonable_encoder and json. The new handler returns rows of the contact columns
+serialized by src.services.serialization. The database is left out so only serialization is measured;
+requests go through the ASGI stack in process with httpx.
+
+Usage:
+    python -m benchmarks.serialization --sizes 1000 10000 --requests 200
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from src.database.models import Contact
+from src.schemas import ResponseContact
+from src.services.serialization import dump_contacts
+
+
+def make_rows(size: int) -> list[tuple]:
+    return [
+        (i, f"Name{i}", f"Surname{i}", f"user{i}@example.com", f"+38050{i:07d}", date(1990, i % 12 + 1, i % 28 + 1))
+        for i in range(1, size + 1)
+    ]
+
+
+def make_app(rows: list[tuple]) -> FastAPI:
+    contacts = [
+        Contact(id=row[0], firstname=row[1], lastname=row[2], email=row[3], phone=row[4], birthday=row[5])
+        for row in rows
+    ]
+    app = FastAPI()
+
+    @app.get("/old", response_model=List[ResponseContact])
+    async def old():
+        return contacts
+
+    @app.get("/new")
+    async def new():
+        return Response(content=dump_contacts(rows), media_type="application/json")
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get(path)
+            response.raise_for_status()
+        return requests / (time.perf_counter() - start)
+
+
+async def main(sizes: list[int], requests: int):
+    print(f"{'contacts':>10} {'old req/s':>12} {'new req/s':>12} {'speedup':>8}")
+    for size in sizes:
+        app = make_app(make_rows(size))
+        old = await measure(app, "/old", requests)
+        new = await measure(app, "/new", requests)
+        print(f"{size:>10} {old:>12.1f} {new:>12.1f} {new / old:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.requests))
@@ -0,0 +1,71 @@
+"""
+Size and decode time of the cached user, pickled User instance against the compact principal encoding.
+
+The pickled variant is what get_current_user used to store under user:{email}: a User loaded from the
+database, with its ORM state and password hash. The compact variant is the versioned struct layout of
+src.services.principal. With --redis the script also stores both values and reports MEMORY USAGE.
+
+Usage:
+    python -m benchmarks.user_cache --iterations 100000 [--redis]
+"""
+import argparse
+import asyncio
+import pickle
+import time
+
+from src.database.models import Role, User
+from src.services.auth import auth_service
+from src.services.password import password_hasher
+from src.services.principal import Principal, decode_principal, encode_principal
+
+
+def make_user() -> User:
+    return User(
+        id=123456,
+        username="deadpool",
+        email="deadpool@example.com",
+        password=password_hasher.pwd_context.hash("123456789"),
+        refresh_token="x" * 180,
+        avatar="https://res.cloudinary.com/demo/image/upload/c_fill,h_250,w_250/v1700000000/hw14/deadpool",
+        role=Role.user,
+        confirmed=True,
+    )
+
+
+def timed(func, data, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(data)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def redis_memory(values: dict) -> dict:
+    usage = {}
+    for name, value in values.items():
+        key = f"bench:user_cache:{name}"
+        await auth_service.r.set(key, value)
+        usage[name] = await auth_service.r.memory_usage(key)
+        await auth_service.r.delete(key)
+    return usage
+
+
+def main(iterations: int, with_redis: bool):
+    user = make_user()
+    pickled = pickle.dumps(user)
+    compact = encode_principal(Principal.from_user(user))
+    assert decode_principal(compact) == Principal.from_user(user)
+
+    print(f"{'encoding':>10} {'bytes':>8} {'decode us':>10}")
+    print(f"{'pickle':>10} {len(pickled):>8} {timed(pickle.loads, pickled, iterations):>10.2f}")
+    print(f"{'compact':>10} {len(compact):>8} {timed(decode_principal, compact, iterations):>10.2f}")
+    if with_redis:
+        usage = asyncio.run(redis_memory({"pickle": pickled, "compact": compact}))
+        print(f"redis MEMORY USAGE: pickle {usage['pickle']} bytes, compact {usage['compact']} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--redis", action="store_true", help="Also measure MEMORY USAGE in the configured redis")
+    args = parser.parse_args()
+    main(args.iterations, args.redis)
@@ -0,0 +1,42 @@
+"""add contacts change_seq
+
+Revision ID: 0c6b2e9f4d13
+Revises: f3a8c5d1e7b0
+Create Date: 2026-10-17 18:41:09.662815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6b2e9f4d13'
+down_revision: Union[str, None] = 'f3a8c5d1e7b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('contacts', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    # existing contacts are numbered per user in their old sync order, and every counter starts after its last one
+    op.execute(
+        "UPDATE contacts SET change_seq = ranked.seq FROM ("
+        "SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY updated_at, id) AS seq FROM contacts"
+        ") AS ranked WHERE contacts.id = ranked.id"
+    )
+    op.execute(
+        "UPDATE users SET change_seq = COALESCE("
+        "(SELECT max(contacts.change_seq) FROM contacts WHERE contacts.user_id = users.id), 0)"
+    )
+    op.drop_index('ix_contacts_user_id_updated_at_id', table_name='contacts')
+    op.create_index('ix_contacts_user_id_change_seq_id', 'contacts', ['user_id', 'change_seq', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_change_seq_id', table_name='contacts')
+    op.create_index('ix_contacts_user_id_updated_at_id', 'contacts', ['user_id', 'updated_at', 'id'], unique=False)
+    op.drop_column('contacts', 'change_seq')
+    op.drop_column('users', 'change_seq')
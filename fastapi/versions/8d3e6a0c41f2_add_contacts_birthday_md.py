@@ -0,0 +1,34 @@
+"""add contacts birthday_md
+
+Revision ID: 8d3e6a0c41f2
+Revises: 5f1c2d9e8b47
+Create Date: 2026-10-17 13:05:42.918305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3e6a0c41f2'
+down_revision: Union[str, None] = '5f1c2d9e8b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.Integer(), nullable=True))
+    # birthday is stored as YYYY-MM-DD text, month * 100 + day keeps the calendar order
+    op.execute(
+        "UPDATE contacts SET birthday_md = "
+        "CAST(substr(birthday, 6, 2) AS INTEGER) * 100 + CAST(substr(birthday, 9, 2) AS INTEGER) "
+        "WHERE birthday IS NOT NULL AND length(birthday) >= 10"
+    )
+    op.create_index('ix_contacts_user_id_birthday_md', 'contacts', ['user_id', 'birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_md', table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
@@ -0,0 +1,52 @@
+"""add contacts phone_normalized
+
+Revision ID: e41b7d9c2a85
+Revises: b2e94f7a6c13
+Create Date: 2026-10-17 15:48:26.104733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.phone import normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41b7d9c2a85'
+down_revision: Union[str, None] = 'b2e94f7a6c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('phone_normalized', sa.String(), nullable=True))
+    # the normalization rules live in python, so existing rows are backfilled in batches by id
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('phone', sa.String),
+                        sa.column('phone_normalized', sa.String))
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(contacts.c.id, contacts.c.phone)
+            .where(contacts.c.id > last_id, contacts.c.phone.is_not(None))
+            .order_by(contacts.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id')),
+            [{'contact_id': row.id, 'phone_normalized': normalize_phone(row.phone)} for row in rows],
+        )
+        last_id = rows[-1].id
+    op.create_index('ix_contacts_user_id_phone_normalized', 'contacts', ['user_id', 'phone_normalized'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_phone_normalized', table_name='contacts')
+    op.drop_column('contacts', 'phone_normalized')
@@ -0,0 +1,31 @@
+"""contacts email unique among live contacts
+
+Revision ID: f3a8c5d1e7b0
+Revises: e41b7d9c2a85
+Create Date: 2026-10-17 18:02:44.318270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c5d1e7b0'
+down_revision: Union[str, None] = 'e41b7d9c2a85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a tombstone no longer holds its email, another user may add a contact with it
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email_live', 'contacts', ['email'], unique=True,
+                    postgresql_where=sa.text('deleted_at IS NULL'), sqlite_where=sa.text('deleted_at IS NULL'))
+
+
+def downgrade() -> None:
+    # fails while an email is held by a live contact and a tombstone at once
+    op.drop_index('ix_contacts_email_live', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
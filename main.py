@@ -1,21 +1,24 @@
+import asyncio
+import logging
 import time
 from ipaddress import ip_address
 from typing import Callable
-
-import redis.asyncio as redis
+from uuid import uuid4
 
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
 
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
-from src.routes import contacts, auth, users
+from src.routes import contacts, auth, users, metrics
 from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.log import request_id, setup_logging
 app = FastAPI()
+logger = logging.getLogger(__name__)
 
 
 @app.on_event("startup")
@@ -28,8 +31,25 @@ async def startup():
     :return: A future, so we need to wait for it
     :doc-author: Trelent
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
-    await FastAPILimiter.init(r)
+    app.state.log_listener = setup_logging(settings.log_level, settings.log_levels)
+    app.state.user_invalidations = asyncio.create_task(auth_service.listen_invalidations())
+    app.state.revoked_tokens = asyncio.create_task(
+        auth_service.revoked_tokens.run(auth_service.r, settings.revoked_tokens_refresh_interval)
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function stops the background tasks started by startup
+    and flushes the log records still queued.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    app.state.user_invalidations.cancel()
+    app.state.revoked_tokens.cancel()
+    app.state.log_listener.stop()
 
 
 app.add_middleware(
@@ -81,6 +101,46 @@ async def add_process_time_header(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def add_rate_limit_headers(request: Request, call_next):
+    """
+    The add_rate_limit_headers function adds the RateLimit-* headers of the rate limit check
+    the route made, if it made one, to the response.
+
+    :param request: Request: Pass the request object to the function
+    :param call_next: Call the next middleware in the chain
+    :return: A response object with the rate limit headers
+    :doc-author: Trelent
+    """
+    response = await call_next(request)
+    result = getattr(request.state, "rate_limit", None)
+    if result is not None:
+        response.headers.update(result.headers())
+    return response
+
+
+@app.middleware("http")
+async def add_request_id(request: Request, call_next):
+    """
+    The add_request_id function gives every request an id, taken from the X-Request-ID header when the client
+    sent one. The id is stamped on every log record written while the request is handled
+    and returned in the X-Request-ID header of the response.
+
+    :param request: Request: Pass the request object to the function
+    :param call_next: Call the next middleware in the chain
+    :return: A response object with the X-Request-ID header
+    :doc-author: Trelent
+    """
+    rid = request.headers.get("X-Request-ID") or uuid4().hex
+    token = request_id.set(rid)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id.reset(token)
+    response.headers["X-Request-ID"] = rid
+    return response
+
+
 @app.get("/", name='Корінь проекту')
 def read_root():
     """
@@ -93,24 +153,23 @@ def read_root():
 
 
 @app.get("/hw11/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple function that checks if the database is configured correctly.
     It does this by executing a SQL query and checking if it returns any results. If it doesn't, then there's something wrong with the database configuration.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A dictionary with a message
     :doc-author: Trelent
     """
     try:
-        result = db.execute(text("SELECT 1")).fetchone()
-        print(result)
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("healthcheck failed")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                             detail="Error connecting to the database")
 
@@ -118,6 +177,7 @@ def healthchecker(db: Session = Depends(get_db)):
 app.include_router(contacts.router, prefix='/hw11')
 app.include_router(auth.router, prefix='/hw11')
 app.include_router(users.router, prefix='/hw11')
+app.include_router(metrics.router, prefix='/hw11')
 
 
 
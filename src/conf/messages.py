@@ -0,0 +1 @@
+EMAIL_NOT_CONFIRMED = "Email not confirmed"
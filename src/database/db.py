@@ -1,12 +1,13 @@
 import configparser
 import pathlib
 
-from fastapi import HTTPException, status
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 
 from src.conf.config import settings
+from src.database.pool_metrics import pool_metrics, InstrumentedQueuePool
 
 # file_config = pathlib.Path(__file__).parent.parent.joinpath('conf/config.ini')
 # config = configparser.ConfigParser()
@@ -18,16 +19,76 @@ from src.conf.config import settings
 # domain = config.get('DB', 'domain')
 # port = config.get('DB', 'port')
 
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """
+    The async_database_url function swaps the driver of a database url for its asyncio counterpart,
+    so the same SQLALCHEMY_DATABASE_URL setting serves alembic (sync) and the application (async).
+
+    :param url: str: The database url from the settings
+    :return: The url with an async driver
+    :doc-author: Trelent
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+
+def engine_options(url: str, instrumented: bool = False) -> dict:
+    """
+    The engine_options function builds the connection pool options from the settings.
+    SQLite keeps the pool SQLAlchemy picks for it, since it has no server connections to size.
+
+    :param url: str: The database url
+    :param instrumented: bool: Report connection waits of this pool to pool_metrics
+    :return: Keyword arguments for create_async_engine
+    :doc-author: Trelent
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if instrumented:
+        options["poolclass"] = InstrumentedQueuePool
+    return options
+
+
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL), **engine_options(SQLALCHEMY_DATABASE_URL, instrumented=True)
+)
+pool_metrics.attach(engine.sync_engine)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+SQLALCHEMY_REPLICA_URL = settings.sqlalchemy_replica_url
+
+if SQLALCHEMY_REPLICA_URL:
+    replica_engine = create_async_engine(
+        async_database_url(SQLALCHEMY_REPLICA_URL), **engine_options(SQLALCHEMY_REPLICA_URL)
+    )
+    ReadSessionLocal = async_sessionmaker(bind=replica_engine, autoflush=False, expire_on_commit=False)
+else:
+    replica_engine = None
+    ReadSessionLocal = None
 
 
 # Dependency
-def get_db():
+async def get_db():
     """
-    The get_db function is a context manager that returns the database session.
+    The get_db function is a context manager that returns the async database session.
     It also handles any exceptions that may occur during the session, and closes
     the connection when it's done.
 
@@ -38,7 +99,29 @@ def get_db():
     try:
         yield db
     except SQLAlchemyError as err:
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    finally:
+        await db.close()
+
+
+async def get_read_db(db: AsyncSession = Depends(get_db)):
+    """
+    The get_read_db function returns a session bound to the read replica.
+    Without a configured replica it hands back the primary session of the request.
+
+    :param db: AsyncSession: The primary database session
+    :return: A database session for reads
+    :doc-author: Trelent
+    """
+    if ReadSessionLocal is None:
+        yield db
+        return
+    read_db = ReadSessionLocal()
+    try:
+        yield read_db
+    except SQLAlchemyError as err:
+        await read_db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
     finally:
-        db.close()
+        await read_db.close()
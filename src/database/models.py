@@ -7,6 +7,8 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     Boolean,
+    Index,
+    text,
 )
 
 from sqlalchemy.orm import declarative_base, relationship
@@ -30,6 +32,8 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     role = Column("role", Enum(Role), default=Role.user)
     confirmed = Column(Boolean, default=False)
+    # last change number handed out to the user's contacts, see Contact.change_seq
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
 
 
 class Contact(Base):
@@ -37,10 +41,31 @@ class Contact(Base):
     id = Column(Integer, primary_key=True, index=True)
     firstname = Column(String)
     lastname = Column(String)
-    email = Column(String, unique=True, index=True)
+    email = Column(String)
     phone = Column(String, index=True)
+    phone_normalized = Column(String, nullable=True)
     birthday = Column(String, nullable=True)
+    birthday_md = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime, nullable=True)
+    # number of the user's last change to the contact, the sync token of /changes is read from it
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     user_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), nullable=False, default=1)
     user = relationship("User", backref='contacts')
+
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_lastname_id", "user_id", "lastname", "id"),
+        Index("ix_contacts_user_id_birthday_md", "user_id", "birthday_md"),
+        Index("ix_contacts_user_id_change_seq_id", "user_id", "change_seq", "id"),
+        Index("ix_contacts_user_id_phone_normalized", "user_id", "phone_normalized"),
+        # emails are unique among live contacts only, so a tombstone does not hold the email of its owner
+        Index(
+            "ix_contacts_email_live",
+            "email",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
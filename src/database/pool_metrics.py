@@ -0,0 +1,120 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    def __init__(self):
+        """
+        The __init__ function sets every counter to zero.
+        Counters are updated from pool events that run in the driver threads, so they are guarded by a lock.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self._lock = threading.Lock()
+        self.pool = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def attach(self, engine):
+        """
+        The attach function subscribes the counters to the connect, checkout, checkin and invalidate
+        events of the engine pool.
+
+        :param self: Represent the instance of the class
+        :param engine: The sync engine whose pool is observed
+        :return: None
+        :doc-author: Trelent
+        """
+        self.pool = engine.pool
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        """
+        The observe_wait function records how long a caller waited for a connection from the pool.
+
+        :param self: Represent the instance of the class
+        :param seconds: float: Time spent waiting for the connection
+        :param timed_out: bool: Whether the wait ended with a pool timeout
+        :return: None
+        :doc-author: Trelent
+        """
+        with self._lock:
+            self.waits += 1
+            self.wait_time_total += seconds
+            self.wait_time_max = max(self.wait_time_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        """
+        The snapshot function returns the current state of the pool together with the collected counters.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the pool statistics
+        :doc-author: Trelent
+        """
+        pool = self.pool
+        with self._lock:
+            return {
+                "pool_size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_time_avg": self.wait_time_total / self.waits if self.waits else 0.0,
+                "wait_time_max": self.wait_time_max,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that reports the time spent waiting for a free connection to pool_metrics.
+    Pool events fire only once a connection is handed out, so the wait itself is timed here.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe_wait(time.perf_counter() - start)
+        return connection
@@ -1,175 +1,678 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, Select, case, cast, func, insert, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
 from src.database.models import Contact, User
-from src.schemas import ContactModel, ContactUpdateModel
-from datetime import date, timedelta
+from src.schemas import ContactModel, ContactUpdateModel, ContactBatchUpdateItem
+from src.services.contacts_cache import contacts_cache
+from src.services.pagination import clamp_limit, encode_cursor, decode_cursor
+from src.services.phone import normalize_phone
+from src.services.serialization import CONTACT_FIELDS
+from datetime import date, datetime, timedelta
 
+# same order as CONTACT_FIELDS in src.services.serialization
+CONTACT_COLUMNS = (
+    Contact.id,
+    Contact.firstname,
+    Contact.lastname,
+    Contact.email,
+    Contact.phone,
+    Contact.birthday,
+)
+CONTACT_COLUMNS_BY_NAME = {column.key: column for column in CONTACT_COLUMNS}
+EXPORT_BATCH_SIZE = 1000
+STATS_WEEKS = 12
 
-async def get_contacts(db: Session, current_user: User):
+
+def birthday_ordinal(birthday: date | str | None) -> int | None:
+    """
+    The birthday_ordinal function turns a birthday into its month-day ordinal, month * 100 + day.
+    Ordinals keep the calendar order of days within a year, so they can be compared and indexed
+    regardless of the year of birth.
+
+    :param birthday: date | str | None: The birthday as a date or a YYYY-MM-DD string
+    :return: The month-day ordinal or None when there is no birthday
+    :doc-author: Trelent
+    """
+    if not birthday:
+        return None
+    if isinstance(birthday, str):
+        birthday = date.fromisoformat(birthday[:10])
+    return birthday.month * 100 + birthday.day
+
+
+SORT_COLUMNS = {
+    "id": (Contact.id,),
+    "lastname": (Contact.lastname, Contact.id),
+}
+
+
+def select_columns(fields: tuple[str, ...] = CONTACT_FIELDS, sort: str = "id") -> list:
+    """
+    The select_columns function lists the columns to select for a sparse fieldset.
+    The requested columns come first in fields order, followed by the keyset columns
+    of the sort key that were not requested, which are needed to build the next cursor.
+
+    :param fields: tuple[str, ...]: Names of the requested fields
+    :param sort: str: Sort key of the page, id or lastname
+    :return: The columns to select
+    :doc-author: Trelent
     """
-    The get_contacts function returns a list of contacts for the current user.
+    columns = [CONTACT_COLUMNS_BY_NAME[name] for name in fields]
+    columns.extend(column for column in SORT_COLUMNS[sort] if column.key not in fields)
+    return columns
 
-    :param db: Session: Access the database
+
+async def _paginate(db: AsyncSession, stmt: Select, sort: str, after: str | None, limit: int | None):
+    """
+    The _paginate function applies keyset pagination to a contacts query.
+    Rows are ordered by the sort key and only rows after the cursor are read,
+    so the database walks the index from the cursor instead of skipping an offset.
+    One extra row is fetched to know whether a next page exists.
+
+    :param db: AsyncSession: Access the database
+    :param stmt: Select: The filtered contacts query
+    :param sort: str: Sort key, id or lastname
+    :param after: str | None: Cursor of the last row of the previous page
+    :param limit: int | None: Requested page size, capped on the server
+    :return: A tuple of the contact rows on the page and the cursor of the next page or None
+    :doc-author: Trelent
+    """
+    columns = SORT_COLUMNS[sort]
+    limit = clamp_limit(limit)
+    if after:
+        values = decode_cursor(after, sort)
+        if len(values) != len(columns):
+            raise ValueError("Cursor does not match sort order")
+        stmt = stmt.where(tuple_(*columns) > tuple_(*values))
+    result = await db.execute(stmt.order_by(*columns).limit(limit + 1))
+    contacts = result.all()
+    next_cursor = None
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        last = contacts[-1]
+        next_cursor = encode_cursor(sort, [getattr(last, column.key) for column in columns])
+    return contacts, next_cursor
+
+
+async def get_contacts(
+    db: AsyncSession,
+    current_user: User,
+    sort: str = "id",
+    after: str = None,
+    limit: int = None,
+    fields: tuple[str, ...] = CONTACT_FIELDS,
+):
+    """
+    The get_contacts function returns one page of contacts for the current user.
+    Only the columns of the requested fields and the sort key are read.
+
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the user_id from the current user
-    :return: A list of contacts
+    :param sort: str: Sort key of the page, id or lastname
+    :param after: str: Cursor returned with the previous page
+    :param limit: int: Number of contacts on the page
+    :param fields: tuple[str, ...]: Names of the fields to select
+    :return: A tuple of contact rows and the cursor of the next page
+    :doc-author: Trelent
+    """
+    stmt = select(*select_columns(fields, sort)).where(Contact.user_id == current_user.id, Contact.deleted_at.is_(None))
+    return await _paginate(db, stmt, sort, after, limit)
+
+
+async def stream_contacts(db: AsyncSession, current_user: User):
+    """
+    The stream_contacts function yields every contact of the current user one row at a time.
+    Only the exported columns are selected and the result is read through a server-side cursor
+    in batches of EXPORT_BATCH_SIZE rows, so memory use does not grow with the size of the address book.
+
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id from the current user
+    :return: An async iterator of rows with the exported columns
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(user_id=current_user.id).all()
-    return contacts
+    stmt = (
+        select(*CONTACT_COLUMNS)
+        .where(Contact.user_id == current_user.id, Contact.deleted_at.is_(None))
+        .order_by(Contact.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
+
+
+async def stream_all_contacts(db: AsyncSession):
+    """
+    The stream_all_contacts function yields the live contacts of all users ordered by user_id,
+    read through a server-side cursor in batches of EXPORT_BATCH_SIZE rows. It feeds batch jobs
+    that handle one user at a time without loading the whole table.
+
+    :param db: AsyncSession: Access the database
+    :return: An async iterator of rows with user_id and the contact columns
+    :doc-author: Trelent
+    """
+    stmt = (
+        select(Contact.user_id, *CONTACT_COLUMNS)
+        .where(Contact.deleted_at.is_(None))
+        .order_by(Contact.user_id, Contact.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
 
 
-async def get_contact_by_id(contact_id: int, db: Session, current_user: User):
+async def get_contact_by_id(
+    contact_id: int, db: AsyncSession, current_user: User, fields: tuple[str, ...] = CONTACT_FIELDS
+):
     """
     The get_contact_by_id function returns a contact by its id. Args: contact_id (int): The id of the contact to be
-    returned. db (Session): A database session object used for querying the database. current_user (User): The user
+    returned. db (AsyncSession): A database session object used for querying the database. current_user (User): The user
     who is making this request, which will be used to ensure that they are only able to access their own contacts and
     not those of other users.
 
     :param contact_id: int: Specify the id of the contact that is being retrieved from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the current user's id
+    :param fields: tuple[str, ...]: Names of the fields to load, the other columns are deferred
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=contact_id, user_id=current_user.id).first()
-    return contact
+    stmt = select(Contact).where(
+        Contact.id == contact_id, Contact.user_id == current_user.id, Contact.deleted_at.is_(None)
+    )
+    if fields != CONTACT_FIELDS:
+        stmt = stmt.options(load_only(*(CONTACT_COLUMNS_BY_NAME[name] for name in fields)))
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
 
 
-async def get_contact_by_email(contact_email: str, db: Session, current_user: User):
+async def get_contact_by_email(contact_email: str, db: AsyncSession, current_user: User):
     """
     The get_contact_by_email function takes in a contact_email and returns the contact with that email. Args:
-    contact_email (str): The email of the desired Contact object. db (Session): A database session to query for the
+    contact_email (str): The email of the desired Contact object. db (AsyncSession): A database session to query for the
     Contact object. current_user (User): The user who is making this request, used to ensure they are only getting
     their own contacts back.
 
     :param contact_email: str: Get the email of the contact
-    :param db: Session: Connect to the database
+    :param db: AsyncSession: Connect to the database
     :param current_user: User: Ensure that the user is only able to access their own contacts
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contact = (
-        db.query(Contact).filter_by(email=contact_email, user_id=current_user.id).all()
+    stmt = select(Contact).where(
+        Contact.email == contact_email, Contact.user_id == current_user.id, Contact.deleted_at.is_(None)
     )
-    return contact
+    result = await db.execute(stmt)
+    return result.scalars().all()
 
 
 async def get_contact_by_filter(
-    db: Session,
+    db: AsyncSession,
     current_user: User,
     firstname: str = None,
     lastname: str = None,
     email: str = None,
+    sort: str = "id",
+    after: str = None,
+    limit: int = None,
+    fields: tuple[str, ...] = CONTACT_FIELDS,
 ):
     """
-    The get_contact_by_filter function returns a list of contacts that match the filter criteria.
+    The get_contact_by_filter function returns one page of contacts that match the filter criteria.
     The function takes in three optional parameters: firstname, lastname, and email.
     If no parameters are passed to the function it will return all contacts for the current user.
 
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Filter the contacts by user
     :param firstname: str: Filter the contacts by firstname
     :param lastname: str: Filter the contacts by lastname
     :param email: str: Filter the contacts by email
-    :param : Filter the contacts by firstname, lastname and email
-    :return: A list of contacts
+    :param sort: str: Sort key of the page, id or lastname
+    :param after: str: Cursor returned with the previous page
+    :param limit: int: Number of contacts on the page
+    :param fields: tuple[str, ...]: Names of the fields to select
+    :return: A tuple of contact rows and the cursor of the next page
     :doc-author: Trelent
     """
-    query = db.query(Contact)
+    stmt = select(*select_columns(fields, sort)).where(
+        Contact.user_id == current_user.id, Contact.deleted_at.is_(None)
+    )
 
     if firstname:
-        query = query.filter_by(firstname=firstname, user_id=current_user.id)
+        stmt = stmt.where(Contact.firstname == firstname)
     if lastname:
-        query = query.filter_by(lastname=lastname, user_id=current_user.id)
+        stmt = stmt.where(Contact.lastname == lastname)
     if email:
-        query = query.filter_by(email=email, user_id=current_user.id)
-    contacts = query.all()
-    return contacts
+        stmt = stmt.where(Contact.email == email)
+    return await _paginate(db, stmt, sort, after, limit)
 
 
-async def create_contact(body: ContactModel, db: Session, current_user: User):
+async def get_contacts_by_phone(
+    phone: str, db: AsyncSession, current_user: User, fields: tuple[str, ...] = CONTACT_FIELDS
+):
+    """
+    The get_contacts_by_phone function finds the contacts of the current user with a phone number
+    written in any format. The number is normalized and looked up on the (user_id, phone_normalized) index.
+
+    :param phone: str: The phone number as written by the caller
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id from the current user
+    :param fields: tuple[str, ...]: Names of the fields to select
+    :return: A list of contact rows, None when the number has no digits
+    :doc-author: Trelent
+    """
+    phone_normalized = normalize_phone(phone)
+    if phone_normalized is None:
+        return None
+    stmt = select(*select_columns(fields)).where(
+        Contact.user_id == current_user.id,
+        Contact.phone_normalized == phone_normalized,
+        Contact.deleted_at.is_(None),
+    )
+    result = await db.execute(stmt.order_by(Contact.id))
+    return result.all()
+
+
+async def _next_change_seq(db: AsyncSession, user_id: int) -> int:
+    """
+    The _next_change_seq function hands out the next change number of a user. The counter on the user row
+    is bumped in the transaction of the write, which keeps the row locked until the commit, so the changes of
+    one user commit in the order of their numbers and a sync client never reads past a change still in flight.
+    All rows touched by one transaction share its number.
+
+    :param db: AsyncSession: The session of the write
+    :param user_id: int: Id of the owner of the contacts
+    :return: The change number
+    :doc-author: Trelent
+    """
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(change_seq=User.change_seq + 1).returning(User.change_seq)
+    )
+    return result.scalar_one()
+
+
+async def create_contact(body: ContactModel, db: AsyncSession, current_user: User):
     """
     The create_contact function creates a new contact in the database.
 
     :param body: ContactModel: Define the type of data that is expected to be passed in
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the user_id from the current user
     :return: The newly created contact
     :doc-author: Trelent
     """
-    contact = Contact(**body.model_dump(), user_id=current_user.id)
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    # the birthday column is a string, so the date is stored in its ISO form
+    values = {
+        **body.model_dump(mode="json"),
+        "birthday_md": birthday_ordinal(body.birthday),
+        "phone_normalized": normalize_phone(body.phone),
+        "user_id": current_user.id,
+        "change_seq": await _next_change_seq(db, current_user.id),
+    }
+    result = await db.execute(
+        select(Contact)
+        .where(Contact.email == body.email, Contact.user_id == current_user.id, Contact.deleted_at.is_not(None))
+        .order_by(Contact.id.desc())
+        .limit(1)
+    )
+    contact = result.scalar_one_or_none()
+    if contact:
+        # a deleted contact of the same user is brought back, so the user's sync clients see it return
+        # under its old id; tombstones of other users are left alone and keep reporting the deletion
+        for key, value in values.items():
+            setattr(contact, key, value)
+        contact.deleted_at = None
+    else:
+        contact = Contact(**values)
+        db.add(contact)
+    await db.commit()
+    await db.refresh(contact)
+    await contacts_cache.bump(current_user.id)
     return contact
 
 
+async def create_contacts_batch(
+    rows: list[tuple[int, ContactModel]], db: AsyncSession, current_user: User
+):
+    """
+    The create_contacts_batch function inserts a batch of validated contacts with one multi-row INSERT
+    and one commit. Emails of live contacts in the database or earlier in the batch are skipped,
+    deleted contacts of the current user with the email are brought back.
+
+    :param rows: list[tuple[int, ContactModel]]: Line numbers with the contacts to insert
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id from the current user
+    :return: A tuple of the inserted line numbers and the duplicate rows as (line, email)
+    :doc-author: Trelent
+    """
+    emails = [body.email for _, body in rows]
+    result = await db.execute(
+        select(Contact.email, Contact.id, Contact.deleted_at).where(
+            Contact.email.in_(emails),
+            or_(Contact.deleted_at.is_(None), Contact.user_id == current_user.id),
+        )
+    )
+    existing, deleted = set(), {}
+    for email, contact_id, deleted_at in result.all():
+        if deleted_at is None:
+            existing.add(email)
+        else:
+            deleted[email] = contact_id
+    inserted, duplicates, values, revived = [], [], [], []
+    change_seq = None
+    for line, body in rows:
+        if body.email in existing:
+            duplicates.append((line, body.email))
+            continue
+        existing.add(body.email)
+        inserted.append(line)
+        if change_seq is None:
+            change_seq = await _next_change_seq(db, current_user.id)
+        row = {
+            **body.model_dump(mode="json"),
+            "birthday_md": birthday_ordinal(body.birthday),
+            "phone_normalized": normalize_phone(body.phone),
+            "user_id": current_user.id,
+            "change_seq": change_seq,
+        }
+        if body.email in deleted:
+            revived.append({**row, "id": deleted[body.email], "deleted_at": None})
+        else:
+            values.append(row)
+    if values:
+        await db.execute(insert(Contact), values)
+    if revived:
+        await db.execute(update(Contact), revived)
+    if values or revived:
+        await db.commit()
+        await contacts_cache.bump(current_user.id)
+    return inserted, duplicates
+
+
 async def update_contact(
-    body: ContactUpdateModel, contact_id: int, db: Session, current_user: User
+    body: ContactUpdateModel, contact_id: int, db: AsyncSession, current_user: User
 ):
     """
     The update_contact function updates a contact in the database. Args: body (ContactUpdateModel): The updated
-    contact information. contact_id (int): The id of the contact to update. db (Session): A connection to the
+    contact information. contact_id (int): The id of the contact to update. db (AsyncSession): A connection to the
     database session.  This is used for querying and updating data in our DBMS, PostgreSQL, via SQLAlchemy's ORM
     layer.  See https://docs.sqlalchemy.org/en/13/orm/.
 
     :param body: ContactUpdateModel: Get the data from the request body
     :param contact_id: int: Identify which contact to update
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the current user from the request
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = (
-        db.query(Contact).filter_by(id=contact_id, user_id=current_user.id).first()
+    stmt = select(Contact).where(
+        Contact.id == contact_id, Contact.user_id == current_user.id, Contact.deleted_at.is_(None)
     )
+    result = await db.execute(stmt)
+    contact = result.scalar_one_or_none()
     if contact:
         contact.phone = body.phone
+        contact.phone_normalized = normalize_phone(body.phone)
         contact.email = body.email
-        db.commit()
+        contact.change_seq = await _next_change_seq(db, current_user.id)
+        await db.commit()
+        await contacts_cache.bump(current_user.id)
     return contact
 
 
-async def remove_contact(contact_id: int, db: Session):
+async def update_contacts_batch(
+    items: list[ContactBatchUpdateItem], db: AsyncSession, current_user: User
+):
+    """
+    The update_contacts_batch function applies a list of contact changes in one transaction.
+    Items that set the same fields to the same values are grouped into a single
+    UPDATE ... WHERE id IN (...) statement scoped to the current user.
+
+    :param items: list[ContactBatchUpdateItem]: Ids of the contacts with their new email and phone
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Only contacts of this user are updated
+    :return: A tuple of the updated ids and the ids that were not found
+    :doc-author: Trelent
+    """
+    change_seq = await _next_change_seq(db, current_user.id)
+    groups = {}
+    for item in items:
+        changes = item.model_dump(exclude={"id"}, exclude_none=True)
+        if "phone" in changes:
+            changes["phone_normalized"] = normalize_phone(changes["phone"])
+        groups.setdefault(tuple(sorted(changes.items())), []).append(item.id)
+    affected = set()
+    for changes, ids in groups.items():
+        stmt = (
+            update(Contact)
+            .where(Contact.id.in_(ids), Contact.user_id == current_user.id, Contact.deleted_at.is_(None))
+            .values(**dict(changes), change_seq=change_seq)
+            .returning(Contact.id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        affected.update(result.scalars().all())
+    await db.commit()
+    if affected:
+        await contacts_cache.bump(current_user.id)
+    requested = list(dict.fromkeys(item.id for item in items))
+    return sorted(affected), [contact_id for contact_id in requested if contact_id not in affected]
+
+
+async def remove_contacts_batch(ids: list[int], db: AsyncSession, current_user: User):
+    """
+    The remove_contacts_batch function deletes the contacts with the given ids in one statement,
+    scoped to the current user. Rows are kept as tombstones so sync clients learn about the deletion.
+
+    :param ids: list[int]: Ids of the contacts to delete
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Only contacts of this user are deleted
+    :return: A tuple of the deleted ids and the ids that were not found
+    :doc-author: Trelent
+    """
+    stmt = (
+        update(Contact)
+        .where(Contact.id.in_(ids), Contact.user_id == current_user.id, Contact.deleted_at.is_(None))
+        .values(deleted_at=func.now(), change_seq=await _next_change_seq(db, current_user.id))
+        .returning(Contact.id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    affected = set(result.scalars().all())
+    await db.commit()
+    if affected:
+        await contacts_cache.bump(current_user.id)
+    requested = list(dict.fromkeys(ids))
+    return sorted(affected), [contact_id for contact_id in requested if contact_id not in affected]
+
+
+async def remove_contact(contact_id: int, db: AsyncSession):
     """
     The remove_contact function removes a contact from the database.
+    The row is kept as a tombstone with deleted_at set, so sync clients learn about the deletion.
         Args:
             contact_id (int): The id of the contact to be removed.
-            db (Session): A connection to the database.
+            db (AsyncSession): A connection to the database.
 
     :param contact_id: int: Specify the contact id of the contact to be deleted
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=contact_id).first()
+    result = await db.execute(select(Contact).where(Contact.id == contact_id, Contact.deleted_at.is_(None)))
+    contact = result.scalar_one_or_none()
     if contact:
-        db.delete(contact)
-        db.commit()
+        contact.deleted_at = datetime.utcnow()
+        contact.change_seq = await _next_change_seq(db, contact.user_id)
+        await db.commit()
+        await contacts_cache.bump(contact.user_id)
     return contact
 
 
-async def contacts_per_days(days: int, db: Session, current_user: User):
+async def merge_contacts(primary_id: int, duplicate_ids: list[int], db: AsyncSession, current_user: User):
+    """
+    The merge_contacts function merges duplicate contacts into a primary contact in one transaction.
+    Fields the primary contact lacks are taken from the duplicates in the given order,
+    then the duplicates are deleted as tombstones.
+
+    :param primary_id: int: Id of the contact to keep
+    :param duplicate_ids: list[int]: Ids of the contacts merged into it
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id from the current user
+    :return: A tuple of the primary contact or None when it is not found, and the ids of the merged contacts
+    :doc-author: Trelent
+    """
+    ids = list(dict.fromkeys([primary_id, *duplicate_ids]))
+    result = await db.execute(
+        select(Contact).where(
+            Contact.id.in_(ids), Contact.user_id == current_user.id, Contact.deleted_at.is_(None)
+        )
+    )
+    contacts = {contact.id: contact for contact in result.scalars().all()}
+    primary = contacts.pop(primary_id, None)
+    if primary is None:
+        return None, []
+    merged = [contact_id for contact_id in ids[1:] if contact_id in contacts]
+    now = datetime.utcnow()
+    change_seq = await _next_change_seq(db, current_user.id) if merged else None
+    for contact_id in merged:
+        duplicate = contacts[contact_id]
+        for field in ("firstname", "lastname", "phone", "birthday"):
+            if not getattr(primary, field) and getattr(duplicate, field):
+                setattr(primary, field, getattr(duplicate, field))
+        duplicate.deleted_at = now
+        duplicate.change_seq = change_seq
+    primary.birthday_md = birthday_ordinal(primary.birthday)
+    primary.phone_normalized = normalize_phone(primary.phone)
+    if merged:
+        primary.change_seq = change_seq
+        await db.commit()
+        await contacts_cache.bump(current_user.id)
+    return primary, merged
+
+
+async def contacts_per_days(
+    days: int, db: AsyncSession, current_user: User, fields: tuple[str, ...] = CONTACT_FIELDS
+):
     """
     The contacts_per_days function returns a list of contacts that have birthdays within the next X days.
+    Birthdays are compared by their month-day ordinal, so the year of birth does not matter and
+    a period that crosses the new year is answered as two index ranges: after today or up to the end date.
 
     :param days: int: Determine how many days in the future we want to look for contacts
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Filter the contacts by user
-    :return: All contacts that have a birthday between today and the number of days in the future
+    :param fields: tuple[str, ...]: Names of the fields to select
+    :return: All contacts that have a birthday between today and the number of days in the future, soonest first
     :doc-author: Trelent
     """
     today = date.today()
     future_date = today + timedelta(days)
-    today_str = today.strftime("%Y-%m-%d")
-    future_date_str = future_date.strftime("%Y-%m-%d")
-    contacts = (
-        db.query(Contact)
-        .filter(
-            Contact.birthday > today_str,
-            Contact.birthday <= future_date_str,
-            user_id=current_user.id,
-        )
-        .all()
+    start = birthday_ordinal(today)
+    end = birthday_ordinal(future_date)
+    stmt = select(*select_columns(fields)).where(Contact.user_id == current_user.id, Contact.deleted_at.is_(None))
+    if future_date.year > today.year:
+        stmt = stmt.where(
+            or_(Contact.birthday_md > start, Contact.birthday_md <= end)
+        ).order_by(case((Contact.birthday_md > start, 0), else_=1), Contact.birthday_md)
+    else:
+        stmt = stmt.where(
+            Contact.birthday_md > start, Contact.birthday_md <= end
+        ).order_by(Contact.birthday_md)
+    result = await db.execute(stmt)
+    return result.all()
+
+
+async def get_contact_changes(db: AsyncSession, current_user: User, since: str = None, limit: int = None):
+    """
+    The get_contact_changes function returns the contacts created, updated or deleted after a sync token.
+    Changes are read in (change_seq, id) order from the (user_id, change_seq, id) index, so the cost
+    depends on the number of changes and not on the size of the address book. Change numbers of a user
+    commit in order, unlike timestamps, so a change committed after a sync is never behind its token.
+    Without a token only live contacts are returned, as the initial full sync.
+
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Filter the contacts by user
+    :param since: str: Sync token returned by the previous call
+    :param limit: int: Maximum number of changes to return
+    :return: A tuple of the changed contacts, the next sync token and whether more changes are waiting
+    :doc-author: Trelent
+    """
+    limit = clamp_limit(limit)
+    stmt = select(Contact).where(Contact.user_id == current_user.id)
+    if since:
+        try:
+            change_seq, contact_id = decode_cursor(since, "changes")
+        except (TypeError, ValueError):
+            raise ValueError("Invalid sync token")
+        if not isinstance(change_seq, int) or not isinstance(contact_id, int):
+            raise ValueError("Invalid sync token")
+        stmt = stmt.where(tuple_(Contact.change_seq, Contact.id) > tuple_(change_seq, contact_id))
+    else:
+        stmt = stmt.where(Contact.deleted_at.is_(None))
+    result = await db.execute(stmt.order_by(Contact.change_seq, Contact.id).limit(limit + 1))
+    contacts = result.scalars().all()
+    has_more = len(contacts) > limit
+    contacts = contacts[:limit]
+    if contacts:
+        last = contacts[-1]
+        since = encode_cursor("changes", [last.change_seq, last.id])
+    elif not since:
+        since = encode_cursor("changes", [0, 0])
+    return contacts, since, has_more
+
+
+def _week_start(db: AsyncSession):
+    """
+    The _week_start function returns the SQL expression of the monday of the week a contact was created in.
+    PostgreSQL truncates the timestamp with date_trunc, SQLite moves back to the monday with date modifiers.
+
+    :param db: AsyncSession: The session, used to find the database dialect
+    :return: A date expression to group by
+    :doc-author: Trelent
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc("week", Contact.created_at), Date)
+    return func.date(Contact.created_at, "-6 days", "weekday 1")
+
+
+async def contacts_stats(db: AsyncSession, user_id: int = None, weeks: int = STATS_WEEKS) -> dict:
+    """
+    The contacts_stats function counts the live contacts of one user, or of all users when user_id is None.
+    Every figure is a GROUP BY in the database: birthdays per month from the month-day ordinal,
+    contacts added per week over the last weeks and, for all users, contacts per user.
+
+    :param db: AsyncSession: Access the database
+    :param user_id: int: Id of the owner of the contacts, None for all users
+    :param weeks: int: Number of past weeks to count added contacts for
+    :return: A dictionary with total, birthdays_per_month, added_per_week and, for all users, per_user
+    :doc-author: Trelent
+    """
+    live = [Contact.deleted_at.is_(None)]
+    if user_id is not None:
+        live.append(Contact.user_id == user_id)
+
+    result = await db.execute(select(func.count()).select_from(Contact).where(*live))
+    stats = {"total": result.scalar_one()}
+
+    month = (Contact.birthday_md // 100).label("month")
+    result = await db.execute(
+        select(month, func.count()).where(*live, Contact.birthday_md.is_not(None)).group_by(month).order_by(month)
     )
-    return contacts
+    stats["birthdays_per_month"] = [{"month": row[0], "count": row[1]} for row in result.all()]
+
+    week = _week_start(db).label("week")
+    since = datetime.utcnow() - timedelta(weeks=weeks)
+    result = await db.execute(
+        select(week, func.count()).where(*live, Contact.created_at >= since).group_by(week).order_by(week)
+    )
+    stats["added_per_week"] = [{"week": row[0], "count": row[1]} for row in result.all()]
+
+    if user_id is None:
+        result = await db.execute(
+            select(Contact.user_id, func.count()).where(*live).group_by(Contact.user_id).order_by(Contact.user_id)
+        )
+        stats["per_user"] = [{"user_id": row[0], "count": row[1]} for row in result.all()]
+    return stats
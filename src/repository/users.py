@@ -1,83 +1,94 @@
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.models import User
 from src.schemas import UserModel
 
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
     The get_user_by_email function takes in an email and a database session,
     and returns the user with that email if it exists. If no such user exists,
     it returns None.
 
     :param email: str: Specify the type of the parameter
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object or none
     :doc-author: Trelent
     """
-    return db.query(User).filter_by(email=email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalar_one_or_none()
 
 
-async def create_user(body: UserModel, db: Session):
+async def get_user_by_id(user_id: int, db: AsyncSession) -> User | None:
+    """
+    The get_user_by_id function returns the user with the given id, or None if there is no such user.
+
+    :param user_id: int: Id of the user
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A user object or none
+    :doc-author: Trelent
+    """
+    return await db.get(User, user_id)
+
+
+async def create_user(body: UserModel, db: AsyncSession):
     """
     The create_user function creates a new user in the database.
 
     :param body: UserModel: Validate the data that is passed in
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object
     :doc-author: Trelent
     """
     g = Gravatar(body.email)
     new_user = User(**body.model_dump(), avatar=g.get_image())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, refresh_token, db: Session):
+async def update_password(user: User, password: str, db: AsyncSession) -> None:
     """
-    The update_token function updates the refresh token for a user in the database.
-        Args:
-            user (User): The User object to update.
-            refresh_token (str): The new refresh token to store in the database.
-            db (Session): A connection to our Postgres database.
-
-    :param user: User: Pass the user object to the function
-    :param refresh_token: Update the user's refresh token in the database
-    :param db: Session: Pass the database session into the function
-    :return: The user object
+    The update_password function stores a new password hash for a user,
+    for example the same password rehashed with the current bcrypt cost.
+
+    :param user: User: The user to update
+    :param password: str: The new password hash
+    :param db: AsyncSession: Pass the database session into the function
+    :return: None
     :doc-author: Trelent
     """
-    user.refresh_token = refresh_token
-    db.commit()
+    user.password = password
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     The confirmed_email function takes in an email and a database session,
     and sets the confirmed field of the user with that email to True.
 
     :param email: str: Pass the email address of the user that is to be confirmed
-    :param db: Session: Pass the database session into the function
+    :param db: AsyncSession: Pass the database session into the function
     :return: None
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     The update_avatar function updates the avatar of a user.
     :param email: Find the user in the database
     :param url: str: Specify the type of data that is expected to be passed into the function
-    :param db: Session: Pass in the database session
+    :param db: AsyncSession: Pass in the database session
     :return: The updated user
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
     return user
@@ -1,134 +1,461 @@
-from typing import List
+from typing import List, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query, UploadFile, File, Header
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.conf.config import settings
+from src.database.db import get_db, get_read_db
 from src.database.models import User, Role
-from src.schemas import ContactModel, ResponseContact, ContactUpdateModel
+from src.schemas import (
+    ContactModel,
+    ResponseContact,
+    ContactUpdateModel,
+    ContactPage,
+    ContactImportReport,
+    ImportRowError,
+    ContactBatchUpdate,
+    ContactBatchDelete,
+    ContactBatchResult,
+    ContactChanges,
+    ContactStats,
+    ContactStatsAll,
+    ContactDuplicates,
+    ContactMerge,
+    ContactMergeResult,
+)
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
+from src.services.contacts_cache import contacts_cache
+from src.services.contacts_io import ndjson_lines, csv_lines, parse_import_rows, MEDIA_TYPES
+from src.services.dedup import find_duplicate_groups
+from src.services.rate_limit import RateLimit
+from src.services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from src.services.read_routing import read_routing
+from src.services.serialization import (
+    contact_row_to_dict,
+    dump_contact,
+    dump_contact_page,
+    dump_contacts,
+    parse_fields,
+)
 from src.services.roles import RoleAccess
 
-router = APIRouter(prefix="/contacts", tags=["contacts"])
+router = APIRouter(prefix="/contacts", tags=["contacts"], default_response_class=ORJSONResponse)
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_BATCH_SIZE = 5000
+FIELDS_DESCRIPTION = "Comma separated fields to return, for example id,firstname,lastname. The id is always returned"
 
 allowed_operation_get = RoleAccess([Role.admin, Role.moderator, Role.user])
 allowed_operation_create = RoleAccess([Role.admin, Role.moderator, Role.user])
 allowed_operation_update = RoleAccess([Role.admin, Role.moderator, Role.user])
 allowed_operation_remove = RoleAccess([Role.admin])
+allowed_operation_stats_all = RoleAccess([Role.admin])
+
+
+def _etag_matches(if_none_match: str | None, etag: str | None, exists: bool = True) -> bool:
+    """
+    The _etag_matches function checks whether the client already holds the representation tagged with etag.
+    The "*" tag matches any current representation, so it is only honoured once the representation is known
+    to exist; a route that has not looked it up yet passes exists=False.
+
+    :param if_none_match: str | None: Value of the If-None-Match request header
+    :param etag: str | None: Entity tag of the current representation
+    :param exists: bool: Whether the representation was found
+    :return: True when the client copy is current
+    :doc-author: Trelent
+    """
+    if not if_none_match or etag is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return (exists and "*" in tags) or etag in tags
+
+
+def _parse_fields(fields: str | None) -> tuple[str, ...]:
+    """
+    The _parse_fields function reads the fields query parameter and answers 400 for unknown field names.
+
+    :param fields: str | None: Value of the fields query parameter
+    :return: The names of the selected fields
+    :doc-author: Trelent
+    """
+    try:
+        return parse_fields(fields)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+def _json_response(content: bytes | None, etag: str | None) -> Response:
+    """
+    The _json_response function wraps an already serialized body, or no body for 304 Not Modified,
+    in a response that carries the ETag.
+
+    :param content: bytes | None: The serialized body, None for 304 Not Modified
+    :param etag: str | None: Entity tag of the representation
+    :return: A response
+    :doc-author: Trelent
+    """
+    headers = {"ETag": etag} if etag else None
+    if content is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @router.get(
     "/",
-    response_model=List[ResponseContact],
-    dependencies=[Depends(allowed_operation_get), Depends(RateLimiter(times=2, seconds=5))],
+    response_model=ContactPage,
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_contacts"))],
 )
 async def get_contacts(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(read_routing.get_session),
     firstname: str = Query(default=None),
     lastname: str = Query(default=None),
     email: str = Query(default=None),
-    current_user: User = Depends(auth_service.get_current_user),
+    sort: Literal["id", "lastname"] = Query(default="id"),
+    after: str = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, description=f"Capped at {MAX_PAGE_SIZE}"),
+    fields: str = Query(default=None, description=FIELDS_DESCRIPTION),
+    if_none_match: str = Header(default=None),
+    current_user: User = Depends(auth_service.get_current_principal),
 ):
     """
-    The get_contacts function returns a list of contacts.
+    The get_contacts function returns one page of contacts.
+    The next page is requested by passing the returned next_cursor as the after parameter.
+    Serialized pages are cached in redis under the current version of the user's address book,
+    and the version doubles as the ETag, so If-None-Match is answered with 304 before any query runs.
+    The page is serialized with orjson straight from the selected rows, response_model only documents it.
+    With fields only those columns are read and returned.
 
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the read database session
     :param firstname: str: Filter the contacts by firstname
     :param lastname: str: Filter the contacts by lastname
     :param email: str: Filter the contacts by email
+    :param sort: str: Order the contacts by id or by lastname
+    :param after: str: Cursor of the previous page
+    :param limit: int: Number of contacts on the page
+    :param fields: str: Comma separated fields to return
+    :param if_none_match: str: ETag of the page the client already has
     :param current_user: User: Get the current user from the database
-    :param : Get the contact by id
-    :return: A list of contacts
+    :return: A page of contacts with the cursor of the next page
     :doc-author: Trelent
     """
-    if firstname or lastname or email:
-        contacts = await repository_contacts.get_contact_by_filter(
-            db, current_user, firstname, lastname, email
-        )
-    else:
-        contacts = await repository_contacts.get_contacts(db, current_user)
+    selected = _parse_fields(fields)
+    name = contacts_cache.key("page", firstname, lastname, email, sort, after, limit, ",".join(selected))
+    version = await contacts_cache.version(current_user.id)
+    etag = contacts_cache.etag(current_user.id, version, name)
+    if _etag_matches(if_none_match, etag):
+        return _json_response(None, etag)
+    cached = await contacts_cache.get(current_user.id, version, name)
+    if cached is not None:
+        return _json_response(cached, etag)
+
+    try:
+        if firstname or lastname or email:
+            contacts, next_cursor = await repository_contacts.get_contact_by_filter(
+                db, current_user, firstname, lastname, email, sort, after, limit, selected
+            )
+        else:
+            contacts, next_cursor = await repository_contacts.get_contacts(
+                db, current_user, sort, after, limit, selected
+            )
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
 
     if not contacts:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No contacts found"
         )
 
-    return contacts
+    payload = dump_contact_page(contacts, next_cursor, selected)
+    await contacts_cache.set(current_user.id, version, name, payload)
+    return _json_response(payload, etag)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("export_contacts"))],
+)
+async def export_contacts(
+    format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+    db: AsyncSession = Depends(read_routing.get_session),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The export_contacts function streams all contacts of the current user as NDJSON or CSV.
+    Rows are written to the response as they are read from the database, so the whole
+    address book is never held in memory.
+
+    :param format: str: Output format, ndjson or csv
+    :param db: AsyncSession: Get the read database session
+    :param current_user: User: Get the current user from the database
+    :return: A streaming response with the contacts
+    :doc-author: Trelent
+    """
+    rows = repository_contacts.stream_contacts(db, current_user)
+    lines = csv_lines(rows) if format == "csv" else ndjson_lines(rows)
+    return StreamingResponse(
+        lines,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'},
+    )
+
+
+@router.get(
+    "/changes",
+    response_model=ContactChanges,
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_contact_changes"))],
+)
+async def get_contact_changes(
+    since: str = Query(default=None),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, description=f"Capped at {MAX_PAGE_SIZE}"),
+    db: AsyncSession = Depends(read_routing.get_session),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The get_contact_changes function returns the contacts created, updated or deleted since a sync token.
+    Without a token it returns all contacts. The returned next_since is passed as since on the next call;
+    while has_more is true the client should call again right away.
+
+    :param since: str: Sync token from the previous call
+    :param limit: int: Maximum number of changes to return
+    :param db: AsyncSession: Get the read database session
+    :param current_user: User: Get the current user from the database
+    :return: Changed contacts, ids of deleted contacts and the next sync token
+    :doc-author: Trelent
+    """
+    try:
+        contacts, next_since, has_more = await repository_contacts.get_contact_changes(
+            db, current_user, since, limit
+        )
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    return {
+        "changed": [contact for contact in contacts if contact.deleted_at is None],
+        "deleted": [contact.id for contact in contacts if contact.deleted_at is not None],
+        "next_since": next_since,
+        "has_more": has_more,
+    }
+
+
+@router.get(
+    "/stats",
+    response_model=ContactStats,
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_contacts_stats"))],
+)
+async def get_contacts_stats(
+    db: AsyncSession = Depends(read_routing.get_session),
+    if_none_match: str = Header(default=None),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The get_contacts_stats function returns the dashboard numbers of the current user's address book:
+    the number of contacts, birthdays per month and contacts added per week.
+    The numbers are counted in the database and cached in redis for a short time
+    under the current version of the address book, which is also the ETag.
+
+    :param db: AsyncSession: Get the read database session
+    :param if_none_match: str: ETag of the statistics the client already has
+    :param current_user: User: Get the current user from the database
+    :return: The statistics of the current user's contacts
+    :doc-author: Trelent
+    """
+    name = contacts_cache.key("stats")
+    version = await contacts_cache.version(current_user.id)
+    etag = contacts_cache.etag(current_user.id, version, name)
+    if _etag_matches(if_none_match, etag):
+        return _json_response(None, etag)
+    cached = await contacts_cache.get(current_user.id, version, name)
+    if cached is not None:
+        return _json_response(cached, etag)
+
+    stats = await repository_contacts.contacts_stats(db, current_user.id)
+    payload = orjson.dumps(stats)
+    await contacts_cache.set(current_user.id, version, name, payload, ttl=settings.contacts_stats_ttl)
+    return _json_response(payload, etag)
+
+
+@router.get(
+    "/stats/all",
+    response_model=ContactStatsAll,
+    dependencies=[Depends(allowed_operation_stats_all), Depends(RateLimit("get_contacts_stats_all"))],
+)
+async def get_contacts_stats_all(db: AsyncSession = Depends(get_read_db)):
+    """
+    The get_contacts_stats_all function returns the dashboard numbers over the contacts of all users,
+    including the number of contacts per user. It is available to admins only.
+    The result is cached in redis for a short time and shared by all admins.
+
+    :param db: AsyncSession: Get the replica session, the numbers need not include the latest writes
+    :return: The statistics of all contacts
+    :doc-author: Trelent
+    """
+    name = contacts_cache.key("stats", "all")
+    cached = await contacts_cache.get_shared(name)
+    if cached is not None:
+        return _json_response(cached, None)
+
+    stats = await repository_contacts.contacts_stats(db)
+    payload = orjson.dumps(stats)
+    await contacts_cache.set_shared(name, payload, settings.contacts_stats_ttl)
+    return _json_response(payload, None)
+
+
+@router.get(
+    "/duplicates",
+    response_model=ContactDuplicates,
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_duplicate_contacts"))],
+)
+async def get_duplicate_contacts(
+    db: AsyncSession = Depends(read_routing.get_session),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The get_duplicate_contacts function finds groups of contacts of the current user that are likely the same person:
+    the same email in any casing, the same phone number in any format or names that sound alike.
+    The address book is read once and grouped in near-linear time.
+
+    :param db: AsyncSession: Get the read database session
+    :param current_user: User: Get the current user from the database
+    :return: The groups of duplicate contacts
+    :doc-author: Trelent
+    """
+    rows = [row async for row in repository_contacts.stream_contacts(db, current_user)]
+    groups = find_duplicate_groups(rows)
+    payload = orjson.dumps({"groups": [[contact_row_to_dict(row) for row in group] for group in groups]})
+    return Response(content=payload, media_type="application/json")
+
+
+@router.get(
+    "/by-phone/{number}",
+    response_model=List[ResponseContact],
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_contacts_by_phone"))],
+)
+async def get_contacts_by_phone(
+    number: str = Path(min_length=1, max_length=32),
+    fields: str = Query(default=None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(read_routing.get_session),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The get_contacts_by_phone function finds the contacts of the current user with the given phone number,
+    written in any format: spaces, dashes, brackets, +38 or 0038 are all accepted.
+
+    :param number: str: The phone number from the path
+    :param fields: str: Comma separated fields to return
+    :param db: AsyncSession: Get the read database session
+    :param current_user: User: Get the current user from the database
+    :return: A list of contacts with this phone number
+    :doc-author: Trelent
+    """
+    selected = _parse_fields(fields)
+    contacts = await repository_contacts.get_contacts_by_phone(number, db, current_user, selected)
+    if contacts is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid phone number")
+    if not contacts:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return Response(content=dump_contacts(contacts, selected), media_type="application/json")
 
 
 @router.get(
     "/days/{days}",
     response_model=List[ResponseContact],
-    dependencies=[Depends(allowed_operation_get), Depends(RateLimiter(times=2, seconds=5))],
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_contacts_by_days"))],
 )
 async def get_contacts_by_days(
-    days: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    days: int = Path(ge=0),
+    fields: str = Query(default=None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(read_routing.get_session),
+    current_user: User = Depends(auth_service.get_current_principal),
 ):
     """
     The get_contacts function returns a list of contacts for the current user.
     The function takes in an optional days parameter, which is used to filter the results by date.
     If no days parameter is provided, all contacts are returned.
+    The rows are serialized with orjson without building ResponseContact models.
 
     :param days: int: Specify the number of days to get contacts for
-    :param db: Session: Pass the database session to the repository layer
+    :param fields: str: Comma separated fields to return
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the user from the database
     :param : Specify the number of days to look back for contacts
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.contacts_per_days(days, db, current_user)
+    selected = _parse_fields(fields)
+    contacts = await repository_contacts.contacts_per_days(days, db, current_user, selected)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contacts
+    return Response(content=dump_contacts(contacts, selected), media_type="application/json")
 
 
 @router.get(
     "/contact/{contact_id}",
     response_model=ResponseContact,
-    dependencies=[Depends(allowed_operation_get), Depends(RateLimiter(times=2, seconds=5))],
+    dependencies=[Depends(allowed_operation_get), Depends(RateLimit("get_contact_by_id"))],
 )
 async def get_contact_by_id(
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    fields: str = Query(default=None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(read_routing.get_session),
+    if_none_match: str = Header(default=None),
+    current_user: User = Depends(auth_service.get_current_principal),
 ):
     """
     The get_contact function is a GET request that returns the contact with the given ID.
     If no such contact exists, it raises an HTTP 404 error.
+    Found contacts are cached in redis under the current version of the user's address book,
+    which also serves as the ETag for If-None-Match requests.
 
     :param contact_id: int: Get the contact id from the path
-    :param db: Session: Pass the database session to the function
+    :param fields: str: Comma separated fields to return
+    :param db: AsyncSession: Pass the database session to the function
+    :param if_none_match: str: ETag of the contact the client already has
     :param current_user: User: Get the current user from the database
     :param : Specify the type of data that is expected in the request body
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repository_contacts.get_contact_by_id(contact_id, db, current_user)
+    selected = _parse_fields(fields)
+    name = contacts_cache.key("contact", contact_id, ",".join(selected))
+    version = await contacts_cache.version(current_user.id)
+    etag = contacts_cache.etag(current_user.id, version, name)
+    if _etag_matches(if_none_match, etag, exists=False):
+        return _json_response(None, etag)
+    cached = await contacts_cache.get(current_user.id, version, name)
+    if cached is not None:
+        if _etag_matches(if_none_match, etag):
+            return _json_response(None, etag)
+        return _json_response(cached, etag)
+
+    contact = await repository_contacts.get_contact_by_id(contact_id, db, current_user, selected)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contact
+    if _etag_matches(if_none_match, etag):
+        return _json_response(None, etag)
+    payload = dump_contact(contact, selected)
+    await contacts_cache.set(current_user.id, version, name, payload)
+    return _json_response(payload, etag)
 
 
 @router.post(
     "/",
     response_model=ResponseContact,
     status_code=status.HTTP_201_CREATED,
-    dependencies=[Depends(allowed_operation_create), Depends(RateLimiter(times=2, seconds=5))],
+    dependencies=[Depends(allowed_operation_create), Depends(RateLimit("create_contact"))],
 )
 async def create_contact(
     body: ContactModel,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
 ):
     """
     The create_contact function creates a new contact in the database.
 
     :param body: ContactModel: Get the data from the request body
-    :param db: Session: Pass the database session to the repository
+    :param db: AsyncSession: Pass the database session to the repository
     :param current_user: User: Get the current user
     :param : Get the contact id from the url
     :return: A contact model object
@@ -141,20 +468,154 @@ async def create_contact(
             detail=f"Contact with email:{body.email} already exist!",
         )
     contact = await repository_contacts.create_contact(body, db, current_user)
+    await read_routing.mark_write(current_user.id)
 
     return contact
 
 
+@router.post(
+    "/import",
+    response_model=ContactImportReport,
+    dependencies=[Depends(allowed_operation_create), Depends(RateLimit("import_contacts"))],
+)
+async def import_contacts(
+    file: UploadFile = File(),
+    format: Literal["csv", "ndjson"] = Query(default=None),
+    batch_size: int = Query(default=IMPORT_BATCH_SIZE, ge=1, le=IMPORT_MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The import_contacts function creates contacts from an uploaded CSV or NDJSON file.
+    Rows are validated one by one and inserted in batches of batch_size rows, one INSERT and
+    one commit per batch. Rows that fail validation or whose email already exists are skipped
+    and reported with their line numbers.
+
+    :param file: UploadFile: The CSV or NDJSON file
+    :param format: str: Format of the file, guessed from the file name when omitted
+    :param batch_size: int: Number of rows inserted per statement
+    :param db: AsyncSession: Pass the database session to the repository
+    :param current_user: User: Get the current user
+    :return: A report with the number of inserted rows and the skipped rows
+    :doc-author: Trelent
+    """
+    if format is None:
+        format = "csv" if (file.filename or "").lower().endswith(".csv") else "ndjson"
+    report = ContactImportReport()
+    batch = []
+
+    async def flush():
+        inserted, duplicates = await repository_contacts.create_contacts_batch(batch, db, current_user)
+        report.inserted += len(inserted)
+        report.duplicates.extend(
+            ImportRowError(line=line, detail=f"Contact with email:{email} already exist!")
+            for line, email in duplicates
+        )
+        batch.clear()
+
+    async for line, body, error in parse_import_rows(file, format):
+        if error:
+            report.invalid.append(ImportRowError(line=line, detail=error))
+            continue
+        batch.append((line, body))
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    if report.inserted:
+        await read_routing.mark_write(current_user.id)
+    return report
+
+
+@router.post(
+    "/merge",
+    response_model=ContactMergeResult,
+    dependencies=[Depends(allowed_operation_update), Depends(RateLimit("merge_contacts"))],
+)
+async def merge_contacts(
+    body: ContactMerge,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The merge_contacts function merges duplicate contacts into the primary contact.
+    Empty fields of the primary contact are filled from the duplicates, which are then deleted.
+
+    :param body: ContactMerge: Get the primary id and the duplicate ids from the request body
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
+    :return: The merged contact and the ids of the deleted duplicates
+    :doc-author: Trelent
+    """
+    contact, merged = await repository_contacts.merge_contacts(body.primary_id, body.duplicate_ids, db, current_user)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if merged:
+        await read_routing.mark_write(current_user.id)
+    return {"contact": contact, "merged": merged}
+
+
+@router.patch(
+    "/batch",
+    response_model=ContactBatchResult,
+    dependencies=[Depends(allowed_operation_update), Depends(RateLimit("update_contacts_batch"))],
+)
+async def update_contacts_batch(
+    body: ContactBatchUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The update_contacts_batch function updates many contacts of the current user in one transaction.
+    Each item carries the id of a contact and the fields to change.
+
+    :param body: ContactBatchUpdate: Get the ids and changes from the request body
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
+    :return: The updated ids and the ids that were not found
+    :doc-author: Trelent
+    """
+    affected, not_found = await repository_contacts.update_contacts_batch(body.items, db, current_user)
+    if affected:
+        await read_routing.mark_write(current_user.id)
+    return {"affected": affected, "not_found": not_found}
+
+
+@router.delete(
+    "/batch",
+    response_model=ContactBatchResult,
+    dependencies=[Depends(allowed_operation_remove), Depends(RateLimit("remove_contacts_batch"))],
+)
+async def remove_contacts_batch(
+    body: ContactBatchDelete,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
+):
+    """
+    The remove_contacts_batch function deletes many contacts of the current user in one statement.
+
+    :param body: ContactBatchDelete: Get the ids from the request body
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user
+    :return: The deleted ids and the ids that were not found
+    :doc-author: Trelent
+    """
+    affected, not_found = await repository_contacts.remove_contacts_batch(body.ids, db, current_user)
+    if affected:
+        await read_routing.mark_write(current_user.id)
+    return {"affected": affected, "not_found": not_found}
+
+
 @router.patch(
     "/{contact_id}",
     response_model=ResponseContact,
-    dependencies=[Depends(allowed_operation_update), Depends(RateLimiter(times=2, seconds=5))],
+    dependencies=[Depends(allowed_operation_update), Depends(RateLimit("update_contact"))],
 )
 async def update_contact(
     body: ContactUpdateModel,
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
 ):
     """
     The update_contact function updates a contact in the database.
@@ -164,7 +625,7 @@ async def update_contact(
 
     :param body: ContactUpdateModel: Get the data from the request body
     :param contact_id: int: Specify the contact id to be deleted
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user
     :param : Get the id of the contact to be deleted
     :return: The updated contact
@@ -173,24 +634,25 @@ async def update_contact(
     contact = await repository_contacts.update_contact(body, contact_id, db, current_user)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    await read_routing.mark_write(current_user.id)
     return contact
 
 
 @router.delete(
     "/{contact_id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    dependencies=[Depends(allowed_operation_remove), Depends(RateLimiter(times=2, seconds=5))],
+    dependencies=[Depends(allowed_operation_remove), Depends(RateLimit("remove_contact"))],
 )
 async def remove_contact(
     contact_id: int = Path(ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_principal),
 ):
     """
     The remove_contact function removes a contact from the database.
 
     :param contact_id: int: Specify the contact to be removed
-    :param db: Session: Pass the database connection to the repository layer
+    :param db: AsyncSession: Pass the database connection to the repository layer
     :param current_user: User: Get the current user from the database
     :param : Get the contact id from the path
     :return: A contact object
@@ -199,4 +661,5 @@ async def remove_contact(
     contact = await repository_contacts.remove_contact(contact_id, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    await read_routing.mark_write(contact.user_id)
     return contact
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+
+from src.database.models import Role
+from src.database.pool_metrics import pool_metrics
+from src.services.auth import auth_service
+from src.services.contacts_cache import contacts_cache
+from src.services.roles import RoleAccess
+
+# pool and cache internals are for operators only
+router = APIRouter(prefix="/metrics", tags=["metrics"], dependencies=[Depends(RoleAccess([Role.admin]))])
+
+
+@router.get("/db-pool")
+async def db_pool_metrics():
+    """
+    The db_pool_metrics function reports the state of the database connection pool:
+    checked out and overflow connections, checkout counts, timeouts and the time callers waited for a connection.
+
+    :return: A dictionary with the pool statistics
+    :doc-author: Trelent
+    """
+    return pool_metrics.snapshot()
+
+
+@router.get("/contacts-cache")
+async def contacts_cache_metrics():
+    """
+    The contacts_cache_metrics function reports the hits and misses of the contacts cache in this worker.
+
+    :return: A dictionary with hits, misses and the hit rate
+    :doc-author: Trelent
+    """
+    return contacts_cache.stats()
+
+
+@router.get("/user-cache")
+async def user_cache_metrics():
+    """
+    The user_cache_metrics function reports the size, hits and misses of the in-process user cache of this worker.
+
+    :return: A dictionary with the local user cache statistics
+    :doc-author: Trelent
+    """
+    return auth_service.local_users.stats()
@@ -1,13 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Path, UploadFile, File, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
-from src.database.models import User
+from src.database.models import User, Role
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 
 from src.schemas import UserResponse
 from src.services.cloud_image import CloudImage
+from src.services.roles import RoleAccess
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -29,14 +30,14 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 async def update_avatar_user(
     file: UploadFile = File(),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     The update_avatar_user function updates the avatar of a user.
 
     :param file: UploadFile: Get the file from the request
     :param current_user: User: Get the current user
-    :param db: Session: Pass the database session to the repository layer
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param : Get the current user from the database
     :return: A user object
     :doc-author: Trelent
@@ -45,4 +46,28 @@ async def update_avatar_user(
     r = CloudImage.upload(file.file, public_id)
     src_url = CloudImage.get_url_for_avatar(public_id, r)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
+    await auth_service.invalidate_user(current_user.email)
     return user
+
+
+@router.post(
+    "/{user_id}/revoke_sessions",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(RoleAccess([Role.admin]))],
+)
+async def revoke_sessions(user_id: int = Path(ge=1), db: AsyncSession = Depends(get_db)):
+    """
+    The revoke_sessions function signs a user out everywhere, for admins only. It bumps the token version
+    of the user, so with STATELESS_ACCESS_TOKENS on every access token and refresh token issued to the user
+    so far is refused. Access tokens without version claims stay valid until they expire.
+
+    :param user_id: int: Id of the user
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :return: None
+    :doc-author: Trelent
+    """
+    user = await repository_users.get_user_by_id(user_id, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    await auth_service.bump_token_version(user.id)
+    await auth_service.invalidate_user(user.email)
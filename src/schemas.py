@@ -1,4 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from typing import List
+
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from datetime import date
 
 from pydantic_settings import SettingsConfigDict
@@ -24,11 +26,98 @@ class ResponseContact(BaseModel):
     birthday: date | None
 
 
+class ContactPage(BaseModel):
+    items: List[ResponseContact]
+    next_cursor: str | None = None
+
+
+class ContactChanges(BaseModel):
+    changed: List[ResponseContact]
+    deleted: List[int]
+    next_since: str
+    has_more: bool
+
+
+class ContactDuplicates(BaseModel):
+    groups: List[List[ResponseContact]]
+
+
+class ContactMerge(BaseModel):
+    primary_id: int = Field(ge=1)
+    duplicate_ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class ContactMergeResult(BaseModel):
+    contact: ResponseContact
+    merged: List[int]
+
+
+class MonthCount(BaseModel):
+    month: int
+    count: int
+
+
+class WeekCount(BaseModel):
+    week: date
+    count: int
+
+
+class UserCount(BaseModel):
+    user_id: int
+    count: int
+
+
+class ContactStats(BaseModel):
+    total: int
+    birthdays_per_month: List[MonthCount]
+    added_per_week: List[WeekCount]
+
+
+class ContactStatsAll(ContactStats):
+    per_user: List[UserCount]
+
+
+class ImportRowError(BaseModel):
+    line: int
+    detail: str
+
+
+class ContactImportReport(BaseModel):
+    inserted: int = 0
+    duplicates: List[ImportRowError] = []
+    invalid: List[ImportRowError] = []
+
+
 class ContactUpdateModel(BaseModel):
     email: EmailStr
     phone: str
 
 
+class ContactBatchUpdateItem(BaseModel):
+    id: int = Field(ge=1)
+    email: EmailStr | None = None
+    phone: str | None = None
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        if self.email is None and self.phone is None:
+            raise ValueError("Nothing to update, set email or phone")
+        return self
+
+
+class ContactBatchUpdate(BaseModel):
+    items: List[ContactBatchUpdateItem] = Field(min_length=1, max_length=1000)
+
+
+class ContactBatchDelete(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class ContactBatchResult(BaseModel):
+    affected: List[int]
+    not_found: List[int]
+
+
 class UserModel(BaseModel):
     username: str
     email: EmailStr
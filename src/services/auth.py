@@ -1,30 +1,50 @@
-import pickle
+import asyncio
+import hashlib
+import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import uuid4
 
 import redis.asyncio as redis
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
+from redis.exceptions import RedisError
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
+from src.database.models import Role
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.local_cache import LocalCache
+from src.services.password import password_hasher
+from src.services.principal import Principal, decode_principal, encode_principal
+from src.services.revocation import RevokedTokens
+
+logger = logging.getLogger(__name__)
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/hw11/auth/login")
     r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    USER_CACHE_TTL = 900
+    USER_INVALIDATION_CHANNEL = "user:invalidate"
+    TOKEN_VERSION_CHANNEL = "user:token_version"
+    local_users = LocalCache(settings.user_cache_local_size, settings.user_cache_local_ttl)
+    token_versions = LocalCache(settings.user_cache_local_size, settings.user_cache_local_ttl)
+    # every entry gets the remaining lifetime of its token, the cache ttl is only a fallback
+    token_claims = LocalCache(settings.jwt_claims_cache_size, 900)
+    revoked_tokens = RevokedTokens(
+        settings.revoked_tokens_capacity, settings.revoked_tokens_error_rate, settings.revoked_tokens_retention
+    )
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
-        password as arguments. It then uses the pwd_context object to verify that the
+        password as arguments. It then uses the password hasher to verify on its thread pool that the
         plain-text password matches the hashed one.
 
         :param self: Represent the instance of the class
@@ -33,19 +53,74 @@ class Auth:
         :return: True if the password is correct and false otherwise
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)
+
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        The verify_and_update_password function verifies a password like verify_password and also
+        returns a new hash when the stored one was made with another bcrypt cost.
+
+        :param self: Represent the instance of the class
+        :param plain_password: Pass in the password that is entered by the user
+        :param hashed_password: The hashed password stored in the database
+        :return: A tuple of whether the password is correct and the new hash or None
+        :doc-author: Trelent
+        """
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
-        The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt Bcrypt class.
+        The hash is generated with bcrypt on the thread pool of the password hasher.
 
         :param self: Represent the instance of the class
         :param password: str: Pass in the password that is to be hashed
         :return: A hashed password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await password_hasher.hash(password)
+
+    @staticmethod
+    def token_key(token: str) -> bytes:
+        """
+        The token_key function returns the digest a token is cached under, so the cache never holds the tokens.
+
+        :param token: str: The encoded token
+        :return: The sha256 digest of the token
+        :doc-author: Trelent
+        """
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def decode_token(self, token: str) -> dict:
+        """
+        The decode_token function verifies a token and returns its claims.
+        Verified claims are cached by the digest of the token until the token expires,
+        so a token used on many requests is verified once.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded token
+        :return: The claims of the token, JWTError is raised for an invalid or expired token
+        :doc-author: Trelent
+        """
+        key = self.token_key(token)
+        payload = self.token_claims.get(key)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            ttl = payload.get("exp", 0) - time.time()
+            if ttl > 0:
+                self.token_claims.set(key, payload, ttl)
+        return payload
+
+    def evict_token(self, token: str):
+        """
+        The evict_token function drops the cached claims of a revoked token, so its next use is verified again.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded token
+        :return: None
+        :doc-author: Trelent
+        """
+        self.token_claims.pop(self.token_key(token))
 
     async def create_access_token(
         self, data: dict, expires_delta: Optional[float] = None
@@ -60,7 +135,7 @@ class Auth:
         :param self: Access the class attributes and methods
         :param data: dict: Pass in the data that will be encoded into the jwt
         :param expires_delta: Optional[float]: Set the expiration time of the access token
-        :return: An encoded access token
+        :return: An encoded access token with a unique jti, so it can be revoked
         :doc-author: Trelent
         """
         to_encode = data.copy()
@@ -69,7 +144,7 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"}
+            {"iat": datetime.utcnow(), "exp": expire, "scope": "access_token", "jti": uuid4().hex}
         )
         encoded_access_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
@@ -109,20 +184,18 @@ class Auth:
         The decode_refresh_token function is used to decode the refresh token.
             The function will first try to decode the refresh token using JWT. If it succeeds,
             it will check if the scope of the payload is 'refresh_token'. If so, then we know that this
-            is a valid refresh token, and we can return its email address (which was stored in sub).
+            is a valid refresh token, and we can return its claims: the email address (which was stored in sub),
+            the rotation family (fid) and the token id (jti).
 
         :param self: Represent the instance of the class
         :param refresh_token: str: Pass the refresh token to decode
-        :return: The email of the user that is stored in the refresh_token
+        :return: The claims of the refresh_token
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(
-                refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
-            )
+            payload = self.decode_token(refresh_token)
             if payload["scope"] == "refresh_token":
-                email = payload["sub"]
-                return email
+                return payload
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid scope for token",
@@ -134,7 +207,10 @@ class Auth:
             )
 
     async def get_current_user(
-        self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+        self,
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_read_db),
+        primary_db: AsyncSession = Depends(get_db),
     ):
         """
         The get_current_user function is a dependency that will be used in the
@@ -143,8 +219,9 @@ class Auth:
 
         :param self: Access the class attributes
         :param token: str: Get the token from the request header
-        :param db: Session: Get the database session
-        :return: A user object
+        :param db: AsyncSession: Get the read database session
+        :param primary_db: AsyncSession: Look up users not yet replicated to the read database
+        :return: The principal of the user, cached in this process and in redis in its compact encoding
         :doc-author: Trelent
         """
         credentials_exception = HTTPException(
@@ -154,7 +231,7 @@ class Auth:
         )
 
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload["scope"] == "access_token":
                 email = payload["sub"]
                 if email is None:
@@ -163,22 +240,206 @@ class Auth:
                 raise credentials_exception
         except JWTError:
             raise credentials_exception
+        if await self.revoked_tokens.is_revoked(self.r, payload.get("jti")):
+            raise credentials_exception
+
+        principal = await self.get_principal(email, db, primary_db)
+        if principal is None:
+            raise credentials_exception
+        return principal
+
+    async def get_principal(self, email: str, db: AsyncSession, primary_db: AsyncSession) -> Principal | None:
+        """
+        The get_principal function looks a user up by email in the local cache, then in redis, then in the database.
 
-        # user = await repository_users.get_user_by_email(email, db)
-        user = await self.r.get(f"user:{email}")
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :param db: AsyncSession: The read database session
+        :param primary_db: AsyncSession: Look up users not yet replicated to the read database
+        :return: The principal of the user, or None if there is no such user
+        :doc-author: Trelent
+        """
+        principal = self.local_users.get(email)
+        if principal is not None:
+            return principal
 
-        if user is None:
+        cached = await self.r.get(f"user:{email}")
+        principal = decode_principal(cached) if cached else None
+
+        if principal is None:
             user = await repository_users.get_user_by_email(email, db)
+            if user is None and db is not primary_db:
+                user = await repository_users.get_user_by_email(email, primary_db)
             if user is None:
-                raise credentials_exception
-            await self.r.set(f"user:{email}", pickle.dumps(user))
-            await self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
-        if user is None:
+                return None
+            principal = Principal.from_user(user)
+            await self.r.set(f"user:{email}", encode_principal(principal), ex=self.USER_CACHE_TTL)
+        self.local_users.set(email, principal)
+        return principal
+
+    async def get_current_principal(
+        self,
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_read_db),
+        primary_db: AsyncSession = Depends(get_db),
+    ):
+        """
+        The get_current_principal function is the dependency of the routes that only need the id and the role
+        of the user. When STATELESS_ACCESS_TOKENS is on, access tokens carry uid, role and ver claims and
+        the user is authorized from them alone: the only lookup is the token version of the user, which is
+        kept in this process. A token whose ver is behind the current version of its user is refused.
+        Tokens without these claims are handled by get_current_user.
+
+        :param self: Access the class attributes
+        :param token: str: Get the token from the request header
+        :param db: AsyncSession: Get the read database session
+        :param primary_db: AsyncSession: Look up users not yet replicated to the read database
+        :return: The principal of the user, with no username or avatar when it was built from claims
+        :doc-author: Trelent
+        """
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        if not settings.stateless_access_tokens:
+            return await self.get_current_user(token, db, primary_db)
+        try:
+            payload = self.decode_token(token)
+        except JWTError:
+            raise credentials_exception
+        if payload.get("scope") != "access_token" or payload.get("sub") is None:
+            raise credentials_exception
+        if "uid" not in payload:
+            return await self.get_current_user(token, db, primary_db)
+        if await self.revoked_tokens.is_revoked(self.r, payload.get("jti")):
             raise credentials_exception
-        print(user.__dict__)
-        return user
+        if payload.get("ver") != await self.token_version(payload["uid"]):
+            raise credentials_exception
+        return Principal(payload["uid"], payload["sub"], None, Role(payload["role"]), True, None)
+
+    async def access_token_claims(self, principal: Principal) -> dict:
+        """
+        The access_token_claims function returns the claims an access token of the user is created with.
+        When STATELESS_ACCESS_TOKENS is on they include the id, the role and the current token version of the user.
+
+        :param self: Represent the instance of the class
+        :param principal: Principal: The user the token is for
+        :return: The claims of the access token
+        :doc-author: Trelent
+        """
+        data = {"sub": principal.email}
+        if settings.stateless_access_tokens:
+            data.update(uid=principal.id, role=principal.role.value, ver=await self.token_version(principal.id))
+        return data
+
+    async def token_version(self, user_id: int) -> int:
+        """
+        The token_version function returns the current token version of a user, from this process when it is
+        cached and from redis otherwise. A user whose version was never bumped has version 0.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :return: The token version
+        :doc-author: Trelent
+        """
+        version = self.token_versions.get(user_id)
+        if version is None:
+            stored = await self.r.get(f"user:token_version:{user_id}")
+            version = int(stored) if stored else 0
+            self.token_versions.set(user_id, version)
+        return version
+
+    async def bump_token_version(self, user_id: int) -> int:
+        """
+        The bump_token_version function invalidates every claims access token issued to a user so far,
+        for example after the role of the user was changed. The new version is published on
+        TOKEN_VERSION_CHANNEL, so every worker drops the version it cached.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user
+        :return: The new token version
+        :doc-author: Trelent
+        """
+        version = await self.r.incr(f"user:token_version:{user_id}")
+        self.token_versions.set(user_id, version)
+        await self.r.publish(self.TOKEN_VERSION_CHANNEL, str(user_id))
+        return version
+
+    async def revoke_access_token(self, token: str) -> dict:
+        """
+        The revoke_access_token function revokes an access token before it expires.
+        Tokens issued without a jti cannot be revoked and stay valid until they expire.
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded access token
+        :return: The claims of the token
+        :doc-author: Trelent
+        """
+        try:
+            payload = self.decode_token(token)
+        except JWTError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+            )
+        if payload.get("scope") != "access_token":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid scope for token",
+            )
+        if payload.get("jti"):
+            await self.revoked_tokens.revoke(self.r, payload["jti"])
+        self.evict_token(token)
+        return payload
+
+    async def invalidate_user(self, email: str):
+        """
+        The invalidate_user function drops the cached principal of a user after the user was changed.
+        The redis entry is deleted and the email is published on USER_INVALIDATION_CHANNEL,
+        so every worker evicts it from its local cache.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the changed user
+        :return: None
+        :doc-author: Trelent
+        """
+        self.local_users.pop(email)
+        try:
+            await self.r.delete(f"user:{email}")
+            await self.r.publish(self.USER_INVALIDATION_CHANNEL, email)
+        except RedisError:
+            pass
+
+    async def listen_invalidations(self, retry_delay: float = 1.0):
+        """
+        The listen_invalidations function evicts users from the local cache, and token versions from theirs,
+        as invalidations are published. It runs as a background task for the lifetime of the worker.
+        While the subscription is down messages may be missed, so the local caches are cleared
+        every time it subscribes again.
+
+        :param self: Represent the instance of the class
+        :param retry_delay: float: Seconds to wait before subscribing again after a redis error
+        :return: None
+        :doc-author: Trelent
+        """
+        while True:
+            pubsub = self.r.pubsub()
+            try:
+                await pubsub.subscribe(self.USER_INVALIDATION_CHANNEL, self.TOKEN_VERSION_CHANNEL)
+                self.local_users.clear()
+                self.token_versions.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    if message["channel"].decode("utf-8") == self.TOKEN_VERSION_CHANNEL:
+                        self.token_versions.pop(int(message["data"]))
+                    else:
+                        self.local_users.pop(message["data"].decode("utf-8"))
+            except RedisError:
+                await asyncio.sleep(retry_delay)
+            finally:
+                await pubsub.reset()
 
     def create_email_token(self, data: dict):
         """
@@ -214,7 +475,7 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload["scope"] == "email_token":
                 email = payload["sub"]
                 return email
@@ -223,7 +484,7 @@ class Auth:
                 detail="Invalid scope for token",
             )
         except JWTError as e:
-            print(e)
+            logger.info("invalid email token", extra={"error": str(e)})
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail="Invalid token for email verification",
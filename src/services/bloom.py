@@ -0,0 +1,67 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        The __init__ function sizes the bit array and the number of hashes so that, once capacity items are added,
+        a lookup of an item that was never added is reported as present with probability error_rate.
+
+        :param self: Represent the instance of the class
+        :param capacity: int: Number of items the filter is sized for
+        :param error_rate: float: False positive rate at capacity
+        :return: None
+        :doc-author: Trelent
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item: str):
+        """
+        The positions function yields the bits of an item, derived from one blake2b digest by double hashing.
+
+        :param self: Represent the instance of the class
+        :param item: str: The item
+        :return: An iterator of bit positions
+        :doc-author: Trelent
+        """
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str):
+        """
+        The add function sets the bits of an item.
+
+        :param self: Represent the instance of the class
+        :param item: str: The item
+        :return: None
+        :doc-author: Trelent
+        """
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The nbytes property is the memory taken by the bit array.
+
+        :param self: Represent the instance of the class
+        :return: The size of the bit array in bytes
+        :doc-author: Trelent
+        """
+        return len(self.bits)
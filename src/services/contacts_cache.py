@@ -0,0 +1,183 @@
+import hashlib
+import time
+
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+
+class ContactsCache:
+    def __init__(self, ttl: int):
+        """
+        The __init__ function sets the lifetime of cached entries and resets the hit and miss counters.
+
+        :param self: Represent the instance of the class
+        :param ttl: int: Number of seconds a cached entry lives
+        :return: None
+        :doc-author: Trelent
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def r(self):
+        return auth_service.r
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        The key function builds a short cache entry name from the parameters of a request.
+
+        :param parts: Parameters that select the cached data
+        :return: A digest of the parameters
+        :doc-author: Trelent
+        """
+        raw = "\x1f".join("" if part is None else str(part) for part in parts)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    async def version(self, user_id: int) -> int | None:
+        """
+        The version function returns the current version of the user's address book.
+        Every cached entry is stored under the version it was read at, so bumping the version
+        invalidates all of them at once. A missing counter starts from the current time,
+        so a counter lost from redis never repeats a version handed out before.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contacts
+        :return: The version or None when redis is unavailable
+        :doc-author: Trelent
+        """
+        key = f"contacts:ver:{user_id}"
+        try:
+            version = await self.r.get(key)
+            if version is None:
+                await self.r.set(key, time.time_ns(), nx=True)
+                version = await self.r.get(key)
+        except RedisError:
+            return None
+        return int(version) if version is not None else None
+
+    @staticmethod
+    def etag(user_id: int, version: int | None, name: str) -> str | None:
+        """
+        The etag function builds a strong entity tag for an entry of the given version of the address book.
+        Any change to the user's contacts bumps the version and so changes the tag.
+
+        :param user_id: int: Id of the owner of the contacts
+        :param version: int | None: Version returned by the version function
+        :param name: str: Name of the entry built with the key function
+        :return: The quoted entity tag or None when the version is unknown
+        :doc-author: Trelent
+        """
+        if version is None:
+            return None
+        return f'"{user_id}-{version}-{name[:16]}"'
+
+    async def bump(self, user_id: int):
+        """
+        The bump function moves the user's address book to a new version after a change.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contacts
+        :return: None
+        :doc-author: Trelent
+        """
+        try:
+            await self.r.incr(f"contacts:ver:{user_id}")
+        except RedisError:
+            pass
+
+    async def get(self, user_id: int, version: int | None, name: str) -> bytes | None:
+        """
+        The get function returns a serialized entry cached for the given version of the address book.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contacts
+        :param version: int | None: Version returned by the version function
+        :param name: str: Name of the entry built with the key function
+        :return: The cached bytes or None on a miss
+        :doc-author: Trelent
+        """
+        data = None
+        if version is not None:
+            try:
+                data = await self.r.get(f"contacts:{user_id}:{version}:{name}")
+            except RedisError:
+                data = None
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def set(self, user_id: int, version: int | None, name: str, data: bytes, ttl: int | None = None):
+        """
+        The set function caches a serialized entry under the version it was read at.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the owner of the contacts
+        :param version: int | None: Version returned by the version function before reading the data
+        :param name: str: Name of the entry built with the key function
+        :param data: bytes: The serialized response
+        :param ttl: int | None: Lifetime of the entry in seconds, the cache ttl when omitted
+        :return: None
+        :doc-author: Trelent
+        """
+        if version is None:
+            return
+        try:
+            await self.r.set(f"contacts:{user_id}:{version}:{name}", data, ex=ttl or self.ttl)
+        except RedisError:
+            pass
+
+    async def get_shared(self, name: str) -> bytes | None:
+        """
+        The get_shared function returns an entry that spans all users, such as the admin statistics.
+        Such entries are not versioned and only expire with their ttl.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the entry built with the key function
+        :return: The cached bytes or None on a miss
+        :doc-author: Trelent
+        """
+        try:
+            data = await self.r.get(f"contacts:shared:{name}")
+        except RedisError:
+            data = None
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def set_shared(self, name: str, data: bytes, ttl: int):
+        """
+        The set_shared function caches an entry that spans all users for ttl seconds.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the entry built with the key function
+        :param data: bytes: The serialized response
+        :param ttl: int: Lifetime of the entry in seconds
+        :return: None
+        :doc-author: Trelent
+        """
+        try:
+            await self.r.set(f"contacts:shared:{name}", data, ex=ttl)
+        except RedisError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        The stats function reports the hit and miss counters of this worker.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with hits, misses and the hit rate
+        :doc-author: Trelent
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+contacts_cache = ContactsCache(settings.contacts_cache_ttl)
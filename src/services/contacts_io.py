@@ -0,0 +1,223 @@
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator
+
+from fastapi import UploadFile
+
+from pydantic import ValidationError
+
+from src.schemas import ContactModel
+from src.services.serialization import CONTACT_FIELDS, dump_contact_line
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+IMPORT_CHUNK_SIZE = 64 * 1024
+IMPORT_MAX_RECORD_LINES = 20
+
+
+async def ndjson_lines(rows: AsyncIterator) -> AsyncIterator[str]:
+    """
+    The ndjson_lines function turns contact rows into newline delimited JSON, one object per line.
+
+    :param rows: AsyncIterator: Rows with the exported columns
+    :return: An async iterator of lines
+    :doc-author: Trelent
+    """
+    async for row in rows:
+        yield dump_contact_line(row)
+
+
+async def csv_lines(rows: AsyncIterator) -> AsyncIterator[str]:
+    """
+    The csv_lines function turns contact rows into CSV text, starting with a header line.
+    A single line buffer is reused so only one row is held in memory at a time.
+
+    :param rows: AsyncIterator: Rows with the exported columns
+    :return: An async iterator of lines
+    :doc-author: Trelent
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CONTACT_FIELDS)
+    yield buffer.getvalue()
+    async for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(["" if value is None else value for value in row])
+        yield buffer.getvalue()
+
+
+def _validation_detail(err: ValidationError) -> str:
+    """
+    The _validation_detail function joins the errors of a failed row validation into one readable line.
+
+    :param err: ValidationError: The error raised by ContactModel
+    :return: A string with the field and message of every error
+    :doc-author: Trelent
+    """
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in err.errors()
+    )
+
+
+def _validate(line: int, data) -> tuple[int, ContactModel | None, str | None]:
+    """
+    The _validate function builds a ContactModel from one parsed row.
+    Empty CSV cells are treated as missing values.
+
+    :param line: int: Line number of the row in the uploaded file
+    :param data: The parsed row
+    :return: A tuple of the line number, the contact or None and the error or None
+    :doc-author: Trelent
+    """
+    if not isinstance(data, dict):
+        return line, None, "Row is not an object"
+    data = {key: value for key, value in data.items() if key is not None and value != ""}
+    try:
+        return line, ContactModel(**data), None
+    except ValidationError as err:
+        return line, None, _validation_detail(err)
+
+
+def _decode_line(line: bytes) -> str | None:
+    """
+    The _decode_line function decodes one line of an uploaded file as utf-8 and drops its carriage return.
+
+    :param line: bytes: The line without its newline
+    :return: The decoded line, or None when it is not valid utf-8
+    :doc-author: Trelent
+    """
+    try:
+        return line.decode("utf-8").removesuffix("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def _text_lines(file: UploadFile) -> AsyncIterator[str | None]:
+    """
+    The _text_lines function reads an uploaded file in chunks without blocking the event loop
+    and yields its lines decoded as utf-8, dropping a byte order mark and the line endings.
+    Every line is decoded on its own, so a line that is not valid utf-8 is yielded as None
+    and can be reported as an invalid row without failing the rest of the file.
+
+    :param file: UploadFile: The uploaded file
+    :return: An async iterator of lines, None for a line that could not be decoded
+    :doc-author: Trelent
+    """
+    pending, first = b"", True
+    while chunk := await file.read(IMPORT_CHUNK_SIZE):
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            if first:
+                line, first = line.removeprefix(codecs.BOM_UTF8), False
+            yield _decode_line(line)
+    if pending:
+        yield _decode_line(pending.removeprefix(codecs.BOM_UTF8) if first else pending)
+
+
+def _open_quote(record: str) -> bool:
+    """
+    The _open_quote function checks whether a CSV record ends inside a quoted value, following the rules
+    of the csv module: a quote only opens a quoted value at the start of a field, and a doubled quote
+    inside one is an escaped quote. A stray quote inside an unquoted value does not open anything.
+
+    :param record: str: The lines of the record read so far
+    :return: True when the record continues on the next line
+    :doc-author: Trelent
+    """
+    quoted, field_start, index = False, True, 0
+    while index < len(record):
+        char = record[index]
+        if quoted:
+            if char == '"':
+                if record.startswith('"', index + 1):
+                    index += 1
+                else:
+                    quoted = False
+        elif char == '"' and field_start:
+            quoted = True
+        field_start = not quoted and char in ",\n"
+        index += 1
+    return quoted
+
+
+async def _csv_records(file: UploadFile) -> AsyncIterator[tuple[int, list[str] | None, str | None]]:
+    """
+    The _csv_records function yields the records of an uploaded CSV file.
+    A quoted value may span lines, up to IMPORT_MAX_RECORD_LINES of them. A record whose quote is still
+    open after that many lines is reported as an error and reading goes on with the next line,
+    so one unterminated quote does not swallow the rest of the file.
+
+    :param file: UploadFile: The uploaded file
+    :return: An async iterator of tuples of the line number, the values or None and the error or None
+    :doc-author: Trelent
+    """
+    line, start, record = 0, 0, None
+    async for raw in _text_lines(file):
+        line += 1
+        if raw is None:
+            if record is not None:
+                yield start, None, "Unterminated quoted value"
+                record = None
+            yield line, None, "Line is not valid UTF-8"
+            continue
+        if record is None:
+            start, record = line, raw
+        else:
+            record = f"{record}\n{raw}"
+        if _open_quote(record):
+            if line - start + 1 < IMPORT_MAX_RECORD_LINES:
+                continue
+            yield start, None, "Unterminated quoted value"
+        else:
+            yield line, next(csv.reader([record])), None
+        record = None
+    if record is not None:
+        yield start, None, "Unterminated quoted value"
+
+
+async def parse_import_rows(
+    file: UploadFile, format: str
+) -> AsyncIterator[tuple[int, ContactModel | None, str | None]]:
+    """
+    The parse_import_rows function reads an uploaded CSV or NDJSON file row by row and validates every row
+    with ContactModel. The file is read in chunks with await, so large uploads are handled in constant memory
+    and the event loop is not blocked on the spooled file.
+
+    :param file: UploadFile: The uploaded file
+    :param format: str: Format of the file, csv or ndjson
+    :return: An async iterator of tuples of the line number, the contact or None and the error or None
+    :doc-author: Trelent
+    """
+    if format == "csv":
+        header = None
+        async for line, values, error in _csv_records(file):
+            if error:
+                yield line, None, error
+                continue
+            if not values:
+                continue
+            if header is None:
+                header = values
+                continue
+            row = {name: values[index] if index < len(values) else None for index, name in enumerate(header)}
+            yield _validate(line, row)
+        return
+    line = 0
+    async for raw in _text_lines(file):
+        line += 1
+        if raw is None:
+            yield line, None, "Line is not valid UTF-8"
+            continue
+        if not raw.strip():
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            yield line, None, "Invalid JSON"
+            continue
+        yield _validate(line, data)
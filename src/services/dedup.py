@@ -0,0 +1,199 @@
+"""
+Duplicate contact detection.
+
+Every contact is put into blocks by its normalized email, its normalized phone and the soundex of its name.
+Contacts sharing a block are joined with a disjoint set, so a user's address book is grouped in one pass
+in near-linear time instead of comparing every pair of contacts.
+
+Usage:
+    python -m src.services.dedup
+"""
+import asyncio
+
+import orjson
+
+from src.database.db import SessionLocal
+from src.repository.contacts import stream_all_contacts
+from src.services.phone import normalize_phone
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+    The normalize_email function lowercases an email and strips the whitespace around it.
+
+    :param email: str | None: The email as stored
+    :return: The normalized email or None when there is no email
+    :doc-author: Trelent
+    """
+    if not email:
+        return None
+    return email.strip().lower() or None
+
+
+def soundex(name: str | None) -> str | None:
+    """
+    The soundex function returns the American Soundex code of a name, a letter followed by three digits.
+    Names that sound alike, such as Petrov and Petroff, get the same code.
+
+    :param name: str | None: The name
+    :return: The soundex code or None when the name has no latin letters
+    :doc-author: Trelent
+    """
+    letters = [char for char in (name or "").lower() if "a" <= char <= "z"]
+    if not letters:
+        return None
+    code = letters[0].upper()
+    last = SOUNDEX_CODES.get(letters[0], "")
+    for char in letters[1:]:
+        digit = SOUNDEX_CODES.get(char, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+def blocking_keys(row) -> list[tuple]:
+    """
+    The blocking_keys function lists the blocks a contact belongs to.
+    Two contacts are duplicate candidates when they share at least one block.
+
+    :param row: A row with the contact columns
+    :return: The blocking keys of the contact
+    :doc-author: Trelent
+    """
+    keys = []
+    email = normalize_email(row.email)
+    if email:
+        keys.append(("email", email))
+    phone = normalize_phone(row.phone)
+    if phone:
+        keys.append(("phone", phone))
+    first, last = soundex(row.firstname), soundex(row.lastname)
+    if first and last:
+        keys.append(("name", first, last))
+    return keys
+
+
+class DisjointSet:
+    def __init__(self):
+        """
+        The __init__ function creates an empty disjoint set.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.parent = {}
+
+    def find(self, item):
+        """
+        The find function returns the representative of the set holding item, compressing the path on the way.
+
+        :param self: Represent the instance of the class
+        :param item: The item to look up
+        :return: The representative item
+        :doc-author: Trelent
+        """
+        parent = self.parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent
+            item, parent = parent, grandparent
+        return item
+
+    def union(self, first, second):
+        """
+        The union function merges the sets holding first and second. The smaller representative wins,
+        so a group is always represented by its oldest contact.
+
+        :param self: Represent the instance of the class
+        :param first: An item of the first set
+        :param second: An item of the second set
+        :return: None
+        :doc-author: Trelent
+        """
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+def find_duplicate_groups(rows) -> list[list]:
+    """
+    The find_duplicate_groups function groups the contacts of one user that share a blocking key.
+    Every row is visited once and every key is joined to the first contact seen with it,
+    so the work grows linearly with the number of contacts.
+
+    :param rows: Rows with the contact columns of one user
+    :return: Groups of two or more duplicate rows, each ordered by id, ordered by their first id
+    :doc-author: Trelent
+    """
+    rows = {row.id: row for row in rows}
+    groups = DisjointSet()
+    seen = {}
+    for contact_id, row in rows.items():
+        for key in blocking_keys(row):
+            first = seen.setdefault(key, contact_id)
+            if first != contact_id:
+                groups.union(first, contact_id)
+
+    members = {}
+    for contact_id in groups.parent:
+        members.setdefault(groups.find(contact_id), []).append(contact_id)
+    return [
+        [rows[contact_id] for contact_id in sorted(ids)]
+        for _, ids in sorted(members.items())
+        if len(ids) > 1
+    ]
+
+
+async def scan_all_users(rows):
+    """
+    The scan_all_users function finds the duplicates of every user from one stream of rows ordered by user_id.
+    Only the contacts of the user being grouped are held in memory.
+
+    :param rows: An async iterator of rows with user_id and the contact columns, ordered by user_id
+    :return: An async iterator of (user_id, duplicate groups) for the users that have duplicates
+    :doc-author: Trelent
+    """
+    user_id, batch = None, []
+    async for row in rows:
+        if row.user_id != user_id:
+            if batch:
+                groups = find_duplicate_groups(batch)
+                if groups:
+                    yield user_id, groups
+            user_id, batch = row.user_id, []
+        batch.append(row)
+    if batch:
+        groups = find_duplicate_groups(batch)
+        if groups:
+            yield user_id, groups
+
+
+async def main():
+    """
+    The main function runs the batch job: it prints one JSON line with the duplicate groups of every user that has any.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    async with SessionLocal() as db:
+        async for user_id, groups in scan_all_users(stream_all_contacts(db)):
+            report = {"user_id": user_id, "groups": [[row.id for row in group] for group in groups]}
+            print(orjson.dumps(report).decode("utf-8"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        The __init__ function creates an empty in-process cache holding at most maxsize entries for ttl seconds.
+        The least recently used entry is evicted when the cache is full.
+
+        :param self: Represent the instance of the class
+        :param maxsize: int: Maximum number of entries
+        :param ttl: float: Number of seconds an entry lives
+        :return: None
+        :doc-author: Trelent
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        The get function returns the value cached under key and marks it as recently used.
+
+        :param self: Represent the instance of the class
+        :param key: The key of the entry
+        :return: The cached value or None on a miss or when the entry expired
+        :doc-author: Trelent
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl: float | None = None):
+        """
+        The set function caches value under key for ttl seconds, evicting the least recently used entry when full.
+
+        :param self: Represent the instance of the class
+        :param key: The key of the entry
+        :param value: The value to cache
+        :param ttl: float | None: Lifetime of this entry in seconds, the cache ttl when omitted
+        :return: None
+        :doc-author: Trelent
+        """
+        self.entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        """
+        The pop function removes the entry cached under key.
+
+        :param self: Represent the instance of the class
+        :param key: The key of the entry
+        :return: None
+        :doc-author: Trelent
+        """
+        self.entries.pop(key, None)
+
+    def clear(self):
+        """
+        The clear function removes all entries.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        The stats function reports the size of the cache and its hit and miss counters.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with size, hits, misses and the hit rate
+        :doc-author: Trelent
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
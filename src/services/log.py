@@ -0,0 +1,92 @@
+import logging
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+import orjson
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# attributes every LogRecord has, anything else on a record was passed in extra and is written as a field
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "request_id",
+    "taskName",
+}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        The filter function stamps a record with the id of the request being handled. It runs on the handler
+        the record is emitted to, in the task that logged it, before the record is put on the queue.
+
+        :param self: Represent the instance of the class
+        :param record: logging.LogRecord: The record
+        :return: True, no record is dropped
+        :doc-author: Trelent
+        """
+        record.request_id = request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        The format function renders a record as one JSON line with the time, level, logger, message,
+        request id and the fields passed in extra.
+
+        :param self: Represent the instance of the class
+        :param record: logging.LogRecord: The record
+        :return: The JSON line
+        :doc-author: Trelent
+        """
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode("utf-8")
+
+
+def setup_logging(level: str, levels: dict[str, str]) -> QueueListener:
+    """
+    The setup_logging function renders every record as a JSON line and hands it through a queue to a listener
+    thread that writes it to stdout, so logging never blocks the event loop on the write.
+    The line is rendered before the record is queued, as QueueHandler.prepare drops the exception of a record.
+    The caller keeps the returned listener and stops it at shutdown to flush the queue.
+
+    :param level: str: Level of the root logger
+    :param levels: dict[str, str]: Levels of single loggers by logger name, such as {"src.services.auth": "DEBUG"}
+    :return: The started listener
+    :doc-author: Trelent
+    """
+    queue = SimpleQueue()
+    queue_handler = QueueHandler(queue)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.setFormatter(JsonFormatter())
+    # the queued record carries the rendered line as its message, which the default formatter writes as it is
+    stream_handler = logging.StreamHandler(sys.stdout)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    listener = QueueListener(queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,56 @@
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+SORT_KEYS = ("id", "lastname")
+
+
+def clamp_limit(limit: int | None) -> int:
+    """
+    The clamp_limit function keeps the page size requested by a client inside the bounds the server allows.
+
+    :param limit: int | None: The page size asked for by the client
+    :return: A page size between 1 and MAX_PAGE_SIZE
+    :doc-author: Trelent
+    """
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    """
+    The encode_cursor function packs the sort key name and the key values of the last row of a page
+    into an opaque url-safe string that the client sends back as the after parameter.
+
+    :param sort: str: Name of the sort key the page was built with
+    :param values: list: Values of the sort key columns of the last row
+    :return: An opaque cursor string
+    :doc-author: Trelent
+    """
+    raw = json.dumps({"k": sort, "v": values}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> list:
+    """
+    The decode_cursor function unpacks a cursor made by encode_cursor.
+    A cursor built for another sort key or a damaged one raises ValueError.
+
+    :param cursor: str: The cursor received from the client
+    :param sort: str: Name of the sort key of the current request
+    :return: Values of the sort key columns to continue after
+    :doc-author: Trelent
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        values = payload["v"]
+        key = payload["k"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if key != sort or not isinstance(values, list):
+        raise ValueError("Cursor does not match sort order")
+    return values
@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        """
+        The __init__ function sets up bcrypt with the given cost and the pool its work runs on.
+        bcrypt releases the GIL while hashing, so a thread pool keeps the event loop free.
+        Hashes of any other cost are reported as needing an update.
+
+        :param self: Represent the instance of the class
+        :param rounds: int: The bcrypt cost, as log2 of the number of rounds
+        :param workers: int: Number of threads hashing at the same time
+        :param max_pending: int: Number of calls that may wait for a thread before new ones are refused
+        :return: None
+        :doc-author: Trelent
+        """
+        self.pwd_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.limit = workers + max_pending
+        self.pending = 0
+
+    async def run(self, func, *args):
+        """
+        The run function calls func on the pool and waits for the result without blocking the event loop.
+        When the pool and its queue are full the call is refused with 503, so a burst of logins
+        is shed instead of piling up.
+
+        :param self: Represent the instance of the class
+        :param func: The blocking function to call
+        :param args: Arguments of the function
+        :return: The result of the function
+        :doc-author: Trelent
+        """
+        if self.pending >= self.limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many logins, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        The hash function hashes a password on the pool.
+
+        :param self: Represent the instance of the class
+        :param password: str: The plain password
+        :return: The hash of the password
+        :doc-author: Trelent
+        """
+        return await self.run(self.pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """
+        The verify function checks a password against its hash on the pool.
+
+        :param self: Represent the instance of the class
+        :param password: str: The plain password
+        :param hashed: str: The stored hash
+        :return: True if the password matches
+        :doc-author: Trelent
+        """
+        return await self.run(self.pwd_context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """
+        The verify_and_update function checks a password and, when its hash was made with another cost,
+        also returns a new hash of the password with the current cost.
+
+        :param self: Represent the instance of the class
+        :param password: str: The plain password
+        :param hashed: str: The stored hash
+        :return: A tuple of whether the password matches and the new hash or None
+        :doc-author: Trelent
+        """
+        return await self.run(self.pwd_context.verify_and_update, password, hashed)
+
+
+password_hasher = PasswordHasher(settings.bcrypt_rounds, settings.password_hash_workers, settings.password_hash_queue)
@@ -0,0 +1,24 @@
+import re
+
+DEFAULT_COUNTRY_CODE = "38"
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: str | None, country_code: str = DEFAULT_COUNTRY_CODE) -> str | None:
+    """
+    The normalize_phone function brings a phone number written in any format to its E.164 digits without the plus.
+    Separators are dropped, the 00 international prefix is removed and a national number
+    of ten digits starting with 0 gets the default country code, so +38 (050) 123-45-67,
+    0038 050 1234567 and 050-123-45-67 all become 380501234567.
+
+    :param phone: str | None: The phone as written
+    :param country_code: str: Country code of national numbers
+    :return: The canonical digits or None when the phone has no digits
+    :doc-author: Trelent
+    """
+    digits = NON_DIGITS.sub("", phone or "")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 10 and digits.startswith("0"):
+        digits = country_code + digits
+    return digits or None
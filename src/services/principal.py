@@ -0,0 +1,99 @@
+import struct
+
+from src.database.models import Role
+
+PRINCIPAL_VERSION = 1
+ROLES = tuple(Role)
+ROLE_INDEX = {role: index for index, role in enumerate(ROLES)}
+CONFIRMED = 1
+HAS_AVATAR = 2
+# version, id, role, flags, then the byte lengths of email, username and avatar
+HEADER = struct.Struct("!BQBBHHH")
+
+
+class Principal:
+    __slots__ = ("id", "email", "username", "role", "confirmed", "avatar")
+
+    def __init__(self, id: int, email: str, username: str, role: Role, confirmed: bool, avatar: str | None):
+        """
+        The __init__ function sets the fields of the authenticated user that the routes need.
+        Unlike a detached User instance it carries no ORM state and no password hash.
+
+        :param self: Represent the instance of the class
+        :param id: int: Id of the user
+        :param email: str: Email of the user
+        :param username: str: Name of the user
+        :param role: Role: Role of the user
+        :param confirmed: bool: Whether the email is confirmed
+        :param avatar: str | None: Url of the avatar
+        :return: None
+        :doc-author: Trelent
+        """
+        self.id = id
+        self.email = email
+        self.username = username
+        self.role = role
+        self.confirmed = confirmed
+        self.avatar = avatar
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        """
+        The from_user function copies the principal fields of a User loaded from the database.
+
+        :param cls: Represent the class
+        :param user: User: The user
+        :return: The principal of the user
+        :doc-author: Trelent
+        """
+        return cls(user.id, user.email, user.username, user.role or Role.user, bool(user.confirmed), user.avatar)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Principal):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Principal(id={self.id!r}, email={self.email!r}, role={self.role.value!r})"
+
+
+def encode_principal(principal: Principal) -> bytes:
+    """
+    The encode_principal function packs a principal into a fixed header followed by its utf-8 strings.
+    The first byte is the layout version, so entries written by another layout are never misread.
+
+    :param principal: Principal: The principal to encode
+    :return: The encoded principal
+    :doc-author: Trelent
+    """
+    email = principal.email.encode("utf-8")
+    username = (principal.username or "").encode("utf-8")
+    avatar = (principal.avatar or "").encode("utf-8")
+    flags = (CONFIRMED if principal.confirmed else 0) | (HAS_AVATAR if principal.avatar is not None else 0)
+    header = HEADER.pack(
+        PRINCIPAL_VERSION, principal.id, ROLE_INDEX[principal.role], flags, len(email), len(username), len(avatar)
+    )
+    return header + email + username + avatar
+
+
+def decode_principal(data: bytes) -> Principal | None:
+    """
+    The decode_principal function unpacks a principal made by encode_principal.
+    Entries of another version or damaged ones give None and are treated as a cache miss.
+
+    :param data: bytes: The encoded principal
+    :return: The principal or None
+    :doc-author: Trelent
+    """
+    if len(data) < HEADER.size or data[0] != PRINCIPAL_VERSION:
+        return None
+    _, user_id, role, flags, email_len, username_len, avatar_len = HEADER.unpack_from(data)
+    if len(data) != HEADER.size + email_len + username_len + avatar_len or role >= len(ROLES):
+        return None
+    start = HEADER.size
+    email = data[start:start + email_len].decode("utf-8")
+    start += email_len
+    username = data[start:start + username_len].decode("utf-8")
+    start += username_len
+    avatar = data[start:].decode("utf-8") if flags & HAS_AVATAR else None
+    return Principal(user_id, email, username, ROLES[role], bool(flags & CONFIRMED), avatar)
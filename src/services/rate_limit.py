@@ -0,0 +1,299 @@
+import logging
+import math
+import time
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# GCRA: the key holds the theoretical arrival time (tat) of the next request in milliseconds of the redis clock.
+# A request is allowed when it does not arrive more than period before its tat, which lets limit requests
+# through in any window of period. Returns {allowed, remaining, retry after ms, reset ms}.
+GCRA_SCRIPT = """
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local interval = period / limit
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], string.format('%.3f', new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor((now - allow_at) / interval), 0, math.ceil(new_tat - now)}
+"""
+
+
+class RateLimitResult:
+    __slots__ = ("allowed", "limit", "period", "remaining", "retry_after", "reset")
+
+    def __init__(self, allowed: bool, limit: int, period: float, remaining: int, retry_after: float, reset: float):
+        """
+        The __init__ function sets the outcome of one rate limit check.
+
+        :param self: Represent the instance of the class
+        :param allowed: bool: Whether the request may go on
+        :param limit: int: Number of requests allowed in a period
+        :param period: float: Length of the period in seconds
+        :param remaining: int: Requests still allowed right now
+        :param retry_after: float: Seconds until a refused request may be retried
+        :param reset: float: Seconds until the whole quota is available again
+        :return: None
+        :doc-author: Trelent
+        """
+        self.allowed = allowed
+        self.limit = limit
+        self.period = period
+        self.remaining = remaining
+        self.retry_after = retry_after
+        self.reset = reset
+
+    def headers(self) -> dict[str, str]:
+        """
+        The headers function returns the RateLimit-* headers of the result, and Retry-After when it was refused.
+
+        :param self: Represent the instance of the class
+        :return: The headers
+        :doc-author: Trelent
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+            "RateLimit-Policy": f"{self.limit};w={math.ceil(self.period)}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RedisRateLimitStore:
+    def __init__(self):
+        """
+        The __init__ function registers the GCRA script once, so every hit sends only its sha with EVALSHA.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.gcra_script = auth_service.r.register_script(GCRA_SCRIPT)
+
+    @property
+    def r(self):
+        return auth_service.r
+
+    async def hit(self, key: str, limit: int, period: float) -> tuple[bool, int, float, float]:
+        """
+        The hit function counts a request against a quota shared by all workers, in one atomic GCRA step in redis.
+
+        :param self: Represent the instance of the class
+        :param key: str: The quota the request is counted against
+        :param limit: int: Number of requests allowed in a period
+        :param period: float: Length of the period in seconds
+        :return: A tuple of whether it is allowed, the remaining requests, the retry after and the reset in seconds
+        :doc-author: Trelent
+        """
+        allowed, remaining, retry_after, reset = await self.gcra_script(
+            keys=[f"rl:{key}"], args=[limit, period * 1000], client=self.r
+        )
+        return allowed == 1, remaining, retry_after / 1000, reset / 1000
+
+
+class MemoryRateLimitStore:
+    def __init__(self):
+        """
+        The __init__ function creates an empty store that keeps the quotas in this process,
+        for tests and single-worker setups.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.tats = {}
+
+    async def hit(self, key: str, limit: int, period: float) -> tuple[bool, int, float, float]:
+        """
+        The hit function counts a request against a quota with the same GCRA step as the redis store.
+
+        :param self: Represent the instance of the class
+        :param key: str: The quota the request is counted against
+        :param limit: int: Number of requests allowed in a period
+        :param period: float: Length of the period in seconds
+        :return: A tuple of whether it is allowed, the remaining requests, the retry after and the reset in seconds
+        :doc-author: Trelent
+        """
+        now = time.monotonic()
+        interval = period / limit
+        tat = max(self.tats.get(key, now), now)
+        allow_at = tat + interval - period
+        if now < allow_at:
+            return False, 0, allow_at - now, tat - now
+        self.tats[key] = tat + interval
+        return True, math.floor((now - allow_at) / interval), 0.0, tat + interval - now
+
+
+STORES = {"redis": RedisRateLimitStore, "memory": MemoryRateLimitStore}
+
+
+class RateLimiter:
+    def __init__(self, store, quotas: dict[str, dict[str, str]], local_size: int):
+        """
+        The __init__ function sets the store the quotas are counted in, the quotas and the size of the local buckets.
+        Quotas are given as "times/seconds" by route name and then by role, with "*" as the default of either.
+
+        :param self: Represent the instance of the class
+        :param store: RedisRateLimitStore | MemoryRateLimitStore: Where the quotas are counted
+        :param quotas: dict[str, dict[str, str]]: The quotas, such as {"*": {"*": "2/5", "admin": "20/5"}}
+        :param local_size: int: Number of local token buckets kept in this process
+        :return: None
+        :doc-author: Trelent
+        """
+        self.store = store
+        self.quotas = {
+            route: {role: self.parse_quota(quota) for role, quota in roles.items()} for route, roles in quotas.items()
+        }
+        # every bucket lives for the period of its quota, the cache ttl is only a fallback
+        self.buckets = LocalCache(local_size, 60)
+
+    @staticmethod
+    def parse_quota(quota: str) -> tuple[int, float]:
+        """
+        The parse_quota function reads a quota written as "times/seconds".
+
+        :param quota: str: The quota
+        :return: A tuple of the number of requests and the period in seconds
+        :doc-author: Trelent
+        """
+        times, seconds = quota.split("/")
+        return int(times), float(seconds)
+
+    def quota(self, route: str, role: str) -> tuple[int, float]:
+        """
+        The quota function picks the quota of a role on a route, falling back to the defaults.
+
+        :param self: Represent the instance of the class
+        :param route: str: Name of the route
+        :param role: str: Role of the user
+        :return: A tuple of the number of requests and the period in seconds
+        :doc-author: Trelent
+        """
+        for roles in (self.quotas.get(route, {}), self.quotas.get("*", {})):
+            if role in roles:
+                return roles[role]
+            if "*" in roles:
+                return roles["*"]
+        raise KeyError(f"No rate limit quota for route {route}")
+
+    def take_local(self, key: str, limit: int, period: float) -> float:
+        """
+        The take_local function takes a token from the bucket of a quota in this process. The bucket refills
+        at the rate of the quota and only counts requests the shared store allowed, so it is never emptier than
+        the quota is and a request it refuses would have been refused by the store as well.
+
+        :param self: Represent the instance of the class
+        :param key: str: The quota the request is counted against
+        :param limit: int: Number of requests allowed in a period
+        :param period: float: Length of the period in seconds
+        :return: 0 when a token was taken, otherwise the seconds until the next one
+        :doc-author: Trelent
+        """
+        now = time.monotonic()
+        rate = limit / period
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [float(limit), now]
+            self.buckets.set(key, bucket, period)
+        bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / rate
+        bucket[0] -= 1
+        return 0.0
+
+    def refund_local(self, key: str):
+        """
+        The refund_local function gives back the token of a request the shared store refused.
+
+        :param self: Represent the instance of the class
+        :param key: str: The quota the request was counted against
+        :return: None
+        :doc-author: Trelent
+        """
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            bucket[0] += 1
+
+    async def hit(self, route: str, identity, role: str) -> RateLimitResult:
+        """
+        The hit function counts a request of a user against the quota of its role on a route.
+        A flood is refused by the local bucket without asking the store. When redis cannot be reached
+        the request is let through, as a limiter outage should not take the routes down.
+
+        :param self: Represent the instance of the class
+        :param route: str: Name of the route
+        :param identity: Id of the user
+        :param role: str: Role of the user
+        :return: The outcome of the check
+        :doc-author: Trelent
+        """
+        limit, period = self.quota(route, role)
+        key = f"{route}:{identity}"
+        wait = self.take_local(key, limit, period)
+        if wait:
+            return RateLimitResult(False, limit, period, 0, wait, period)
+        try:
+            allowed, remaining, retry_after, reset = await self.store.hit(key, limit, period)
+        except RedisError:
+            logger.warning("rate limit store unavailable", extra={"route": route})
+            return RateLimitResult(True, limit, period, limit - 1, 0.0, period)
+        if not allowed:
+            self.refund_local(key)
+        return RateLimitResult(allowed, limit, period, remaining, retry_after, reset)
+
+
+rate_limiter = RateLimiter(STORES[settings.rate_limit_store](), settings.rate_limits, settings.rate_limit_local_size)
+
+
+class RateLimit:
+    def __init__(self, route: str):
+        """
+        The __init__ function sets the route name the quotas of the dependency are looked up by.
+
+        :param self: Represent the instance of the class
+        :param route: str: Name of the route
+        :return: None
+        :doc-author: Trelent
+        """
+        self.route = route
+
+    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_principal)):
+        """
+        The __call__ function counts the request against the quota of the user's role on the route.
+        The outcome is kept on request.state, so the RateLimit-* headers are added to the response by a middleware,
+        and a request over the quota is refused with 429.
+
+        :param self: Access the class attributes
+        :param request: Request: Get the request object
+        :param current_user: User: The user making the request
+        :return: None
+        :doc-author: Trelent
+        """
+        result = await rate_limiter.hit(self.route, current_user.id, current_user.role.value)
+        request.state.rate_limit = result
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers=result.headers(),
+            )
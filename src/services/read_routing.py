@@ -0,0 +1,75 @@
+import logging
+
+from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.db import get_db, get_read_db
+from src.database.models import User
+from src.services.auth import auth_service
+
+logger = logging.getLogger(__name__)
+
+
+class ReadRouting:
+    def __init__(self, window: int):
+        """
+        The __init__ function sets how long reads of a user stay on the primary after that user writes.
+
+        :param self: Represent the instance of the class
+        :param window: int: Number of seconds reads stick to the primary after a write
+        :return: None
+        :doc-author: Trelent
+        """
+        self.window = window
+
+    async def mark_write(self, user_id: int):
+        """
+        The mark_write function remembers in redis that the user has just written,
+        so the user's next reads go to the primary and see their own changes despite replica lag.
+        Nothing is stored when there is no replica. The write is already committed when this runs, so when redis
+        cannot be reached the marker is only skipped and the user may read from a lagging replica for a moment.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Id of the user who wrote
+        :return: None
+        :doc-author: Trelent
+        """
+        if not settings.sqlalchemy_replica_url:
+            return
+        try:
+            await auth_service.r.set(f"rw:{user_id}", 1, ex=self.window)
+        except RedisError:
+            logger.warning("read-your-writes marker not stored", extra={"user_id": user_id})
+
+    async def get_session(
+        self,
+        current_user: User = Depends(auth_service.get_current_principal),
+        db: AsyncSession = Depends(get_db),
+        read_db: AsyncSession = Depends(get_read_db),
+    ):
+        """
+        The get_session function is a dependency for read-only routes. It returns the replica session,
+        or the primary one while the current user is inside the read-your-writes window.
+        When redis cannot be reached the window cannot be checked, so the primary session is used.
+
+        :param self: Represent the instance of the class
+        :param current_user: User: The principal of the user making the request, only its id is read
+        :param db: AsyncSession: The primary database session
+        :param read_db: AsyncSession: The replica database session
+        :return: The session the reads should use
+        :doc-author: Trelent
+        """
+        if read_db is db:
+            return db
+        try:
+            if await auth_service.r.exists(f"rw:{current_user.id}"):
+                return db
+        except RedisError:
+            logger.warning("read-your-writes marker not read", extra={"user_id": current_user.id})
+            return db
+        return read_db
+
+
+read_routing = ReadRouting(settings.read_your_writes_seconds)
@@ -0,0 +1,228 @@
+import time
+from uuid import uuid4
+
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+# returns 1 when jti was the current token of the family and is replaced by the new one,
+# 0 when an older token of the family is reused, which revokes the family, -1 when the family is unknown
+ROTATE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    return -1
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class RedisRefreshTokenStore:
+    def __init__(self):
+        """
+        The __init__ function registers the rotate script once, so every rotation sends only its sha with EVALSHA.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.rotate_script = auth_service.r.register_script(ROTATE_SCRIPT)
+
+    @property
+    def r(self):
+        return auth_service.r
+
+    async def start(self, family: str, jti: str, ttl: int):
+        """
+        The start function records the first token of a new family.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :param jti: str: Id of the token
+        :param ttl: int: Seconds the family lives without being refreshed
+        :return: None
+        :doc-author: Trelent
+        """
+        await self.r.set(f"rt:{family}", jti, ex=ttl)
+
+    async def rotate(self, family: str, jti: str, new_jti: str, ttl: int) -> bool:
+        """
+        The rotate function replaces the current token of a family in one atomic compare-and-set.
+        Presenting any other token of the family means it was stolen or replayed, so the family is revoked.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :param jti: str: Id of the presented token
+        :param new_jti: str: Id of the token that replaces it
+        :param ttl: int: Seconds the family lives without being refreshed
+        :return: True when the presented token was the current one
+        :doc-author: Trelent
+        """
+        return await self.rotate_script(keys=[f"rt:{family}"], args=[jti, new_jti, ttl], client=self.r) == 1
+
+    async def revoke(self, family: str):
+        """
+        The revoke function ends a family, so none of its tokens can be refreshed.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :return: None
+        :doc-author: Trelent
+        """
+        await self.r.delete(f"rt:{family}")
+
+
+class MemoryRefreshTokenStore:
+    def __init__(self):
+        """
+        The __init__ function creates an empty store that keeps the families in this process,
+        for tests and single-worker setups.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        self.families = {}
+
+    async def start(self, family: str, jti: str, ttl: int):
+        """
+        The start function records the first token of a new family.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :param jti: str: Id of the token
+        :param ttl: int: Seconds the family lives without being refreshed
+        :return: None
+        :doc-author: Trelent
+        """
+        self.families[family] = (jti, time.monotonic() + ttl)
+
+    async def rotate(self, family: str, jti: str, new_jti: str, ttl: int) -> bool:
+        """
+        The rotate function replaces the current token of a family, revoking the family when another token is presented.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :param jti: str: Id of the presented token
+        :param new_jti: str: Id of the token that replaces it
+        :param ttl: int: Seconds the family lives without being refreshed
+        :return: True when the presented token was the current one
+        :doc-author: Trelent
+        """
+        current = self.families.get(family)
+        if current is None or current[1] <= time.monotonic():
+            self.families.pop(family, None)
+            return False
+        if current[0] != jti:
+            del self.families[family]
+            return False
+        self.families[family] = (new_jti, time.monotonic() + ttl)
+        return True
+
+    async def revoke(self, family: str):
+        """
+        The revoke function ends a family, so none of its tokens can be refreshed.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :return: None
+        :doc-author: Trelent
+        """
+        self.families.pop(family, None)
+
+
+STORES = {"redis": RedisRefreshTokenStore, "memory": MemoryRefreshTokenStore}
+
+
+class RefreshTokens:
+    def __init__(self, store, ttl: int):
+        """
+        The __init__ function sets the store that keeps the current token of every family and the token lifetime.
+
+        :param self: Represent the instance of the class
+        :param store: RedisRefreshTokenStore | MemoryRefreshTokenStore: Where the families are kept
+        :param ttl: int: Lifetime of a refresh token and of an idle family in seconds
+        :return: None
+        :doc-author: Trelent
+        """
+        self.store = store
+        self.ttl = ttl
+
+    async def _issue(self, email: str, family: str, user_id: int | None = None) -> tuple[str, str]:
+        """
+        The _issue function creates a refresh token of the family with a new token id.
+        When STATELESS_ACCESS_TOKENS is on it also carries the id and the current token version of the user.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :param family: str: Id of the family
+        :param user_id: int | None: Id of the user
+        :return: A tuple of the token and its id
+        :doc-author: Trelent
+        """
+        jti = uuid4().hex
+        data = {"sub": email, "fid": family, "jti": jti}
+        if user_id is not None and settings.stateless_access_tokens:
+            data.update(uid=user_id, ver=await auth_service.token_version(user_id))
+        token = await auth_service.create_refresh_token(data=data, expires_delta=self.ttl)
+        return token, jti
+
+    async def start(self, email: str, user_id: int | None = None) -> tuple[str, str]:
+        """
+        The start function opens a new rotation family at login and returns its first refresh token.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :param user_id: int | None: Id of the user
+        :return: A tuple of the id of the family and the refresh token
+        :doc-author: Trelent
+        """
+        family = uuid4().hex
+        token, jti = await self._issue(email, family, user_id)
+        await self.store.start(family, jti, self.ttl)
+        return family, token
+
+    async def rotate(self, refresh_token: str) -> tuple[str, str, str]:
+        """
+        The rotate function exchanges the current refresh token of a family for the next one.
+        A token that is not the current one of its family, because it was already used, or whose ver
+        is behind the current token version of its user, revokes the whole family and is refused.
+        No database query is made.
+
+        :param self: Represent the instance of the class
+        :param refresh_token: str: The refresh token presented by the client
+        :return: A tuple of the user's email, the id of the family and the new refresh token
+        :doc-author: Trelent
+        """
+        payload = await auth_service.decode_refresh_token(refresh_token)
+        email, family, jti = payload.get("sub"), payload.get("fid"), payload.get("jti")
+        user_id = payload.get("uid")
+        auth_service.evict_token(refresh_token)
+        if not email or not family or not jti:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        if user_id is not None and payload.get("ver") != await auth_service.token_version(user_id):
+            await self.store.revoke(family)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        token, new_jti = await self._issue(email, family, user_id)
+        if not await self.store.rotate(family, jti, new_jti, self.ttl):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return email, family, token
+
+    async def revoke(self, family: str):
+        """
+        The revoke function ends a rotation family at logout, so none of its refresh tokens can be used.
+
+        :param self: Represent the instance of the class
+        :param family: str: Id of the family
+        :return: None
+        :doc-author: Trelent
+        """
+        await self.store.revoke(family)
+
+
+refresh_tokens = RefreshTokens(STORES[settings.refresh_token_store](), settings.refresh_token_ttl)
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+from redis.exceptions import RedisError
+
+from src.services.bloom import BloomFilter
+
+
+class RevokedTokens:
+    KEY = "revoked"
+    # revocations are scored by the clock of the worker that made them, so every refresh reads a little
+    # further back than the newest entry it has seen to pick up entries written by a worker with a slower clock
+    CLOCK_SKEW = 5.0
+    BATCH = 10000
+
+    def __init__(self, capacity: int, error_rate: float, retention: int):
+        """
+        The __init__ function sets up the local mirror of the revoked token ids.
+        The ids live in the redis sorted set KEY scored by the time they were revoked, and every worker keeps
+        them in a Bloom filter, so a token that was not revoked is accepted without asking redis.
+
+        :param self: Represent the instance of the class
+        :param capacity: int: Number of revoked ids the filter is sized for
+        :param error_rate: float: False positive rate of the filter at capacity
+        :param retention: int: Seconds an id is kept, at least the lifetime of an access token
+        :return: None
+        :doc-author: Trelent
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.retention = retention
+        self.filter = BloomFilter(capacity, error_rate)
+        self.cursor = 0.0
+        self.built_at = 0.0
+
+    async def revoke(self, r, jti: str):
+        """
+        The revoke function records a token id as revoked. This worker sees it at once,
+        the other workers on their next refresh.
+
+        :param self: Represent the instance of the class
+        :param r: The redis client
+        :param jti: str: Id of the token
+        :return: None
+        :doc-author: Trelent
+        """
+        await r.zadd(self.KEY, {jti: time.time()})
+        self.filter.add(jti)
+
+    async def is_revoked(self, r, jti: str | None) -> bool:
+        """
+        The is_revoked function checks a token id against the filter and only asks redis when the filter
+        reports it as present, which it does for revoked ids and for a small fraction of the others.
+        When redis cannot be reached such a probable hit is treated as revoked.
+
+        :param self: Represent the instance of the class
+        :param r: The redis client
+        :param jti: str | None: Id of the token, tokens issued without one cannot be revoked
+        :return: True if the token was revoked
+        :doc-author: Trelent
+        """
+        if not jti or jti not in self.filter:
+            return False
+        try:
+            return await r.zscore(self.KEY, jti) is not None
+        except RedisError:
+            return True
+
+    async def load(self, r, bloom: BloomFilter, since: float) -> float:
+        """
+        The load function adds to a filter the ids revoked since a time, reading the sorted set in batches.
+
+        :param self: Represent the instance of the class
+        :param r: The redis client
+        :param bloom: BloomFilter: The filter to fill
+        :param since: float: Revoke time to read from
+        :return: The revoke time of the newest id read, or since when there was none
+        :doc-author: Trelent
+        """
+        newest, start = since, 0
+        while True:
+            entries = await r.zrangebyscore(self.KEY, since, "+inf", start=start, num=self.BATCH, withscores=True)
+            for member, score in entries:
+                jti = member.decode("utf-8")
+                if jti not in bloom:
+                    bloom.add(jti)
+                newest = max(newest, score)
+            if len(entries) < self.BATCH:
+                return newest
+            start += self.BATCH
+
+    async def refresh(self, r):
+        """
+        The refresh function brings the filter up to date. Usually only the ids revoked since the last refresh
+        are read. Once per retention period, or when the filter is full, the expired ids are dropped from redis
+        and a new filter is built from the rest and swapped in, since ids cannot be removed from a Bloom filter.
+
+        :param self: Represent the instance of the class
+        :param r: The redis client
+        :return: None
+        :doc-author: Trelent
+        """
+        now = time.time()
+        if now - self.built_at >= self.retention or len(self.filter) >= self.capacity:
+            await r.zremrangebyscore(self.KEY, "-inf", now - self.retention)
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            self.cursor = await self.load(r, bloom, now - self.retention)
+            self.filter, self.built_at = bloom, now
+        else:
+            self.cursor = await self.load(r, self.filter, self.cursor - self.CLOCK_SKEW)
+
+    async def run(self, r, interval: float):
+        """
+        The run function refreshes the filter every interval seconds. It runs as a background task
+        for the lifetime of the worker; while redis is down the filter is left as it is.
+
+        :param self: Represent the instance of the class
+        :param r: The redis client
+        :param interval: float: Seconds between refreshes
+        :return: None
+        :doc-author: Trelent
+        """
+        while True:
+            try:
+                await self.refresh(r)
+            except RedisError:
+                pass
+            await asyncio.sleep(interval)
@@ -1,3 +1,4 @@
+import logging
 from typing import List
 
 from fastapi import Depends, HTTPException, status, Request
@@ -5,6 +6,8 @@ from fastapi import Depends, HTTPException, status, Request
 from src.database.models import User, Role
 from src.services.auth import auth_service
 
+logger = logging.getLogger(__name__)
+
 
 class RoleAccess:
     def __init__(self, allowed_roles: List[Role]):
@@ -20,13 +23,13 @@ class RoleAccess:
         """
         self.allowed_roles = allowed_roles
 
-    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_user)):
+    async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_principal)):
         """
         The __call__ function is the function that will be called when a user tries to access this endpoint. It takes
         in two arguments: request and current_user. The request argument is an object containing information about
         the HTTP Request, such as its method (GET, POST, etc.) and URL. The current_user argument is an object
         containing information about the currently logged-in user (if there is one). This value comes from our
-        auth_service dependency.
+        auth_service dependency, and with STATELESS_ACCESS_TOKENS on it is built from the token claims alone.
 
         :param self: Access the class attributes
         :param request: Request: Get the request object
@@ -34,9 +37,10 @@ class RoleAccess:
         :return: A function that takes a request and current_user as parameters
         :doc-author: Trelent
         """
-        print(request.method, request.url)
-        print(f"User role {current_user.role}")
-        print(f"Allowed roles: {self.allowed_roles}")
         if current_user.role not in self.allowed_roles:
+            logger.info(
+                "operation forbidden",
+                extra={"method": request.method, "path": request.url.path, "role": current_user.role.value},
+            )
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operation forbidden")
 
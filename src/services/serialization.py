@@ -0,0 +1,88 @@
+from typing import Iterable
+
+import orjson
+
+CONTACT_FIELDS = ("id", "firstname", "lastname", "email", "phone", "birthday")
+
+
+def parse_fields(fields: str | None) -> tuple[str, ...]:
+    """
+    The parse_fields function turns the comma separated fields query parameter into a sparse fieldset.
+    The id is always part of the fieldset and the fields keep the CONTACT_FIELDS order,
+    so the same fieldset written in another order gives the same columns and cache entry.
+
+    :param fields: str | None: Comma separated field names, None for all fields
+    :return: The names of the selected fields
+    :doc-author: Trelent
+    """
+    if not fields:
+        return CONTACT_FIELDS
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names.difference(CONTACT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    names.add("id")
+    return tuple(name for name in CONTACT_FIELDS if name in names)
+
+
+def contact_row_to_dict(row, fields: tuple[str, ...] = CONTACT_FIELDS) -> dict:
+    """
+    The contact_row_to_dict function maps a row of the contact columns to the ResponseContact fields.
+    Rows come straight from the typed database columns, so they are not validated again.
+    Columns past the fieldset, such as keyset columns that were only selected for the cursor, are dropped.
+
+    :param row: A row with the selected columns in fields order
+    :param fields: tuple[str, ...]: Names of the selected fields
+    :return: A dictionary with the contact fields
+    :doc-author: Trelent
+    """
+    return dict(zip(fields, row))
+
+
+def dump_contact(contact, fields: tuple[str, ...] = CONTACT_FIELDS) -> bytes:
+    """
+    The dump_contact function serializes the selected fields of one contact object with orjson.
+
+    :param contact: Contact: The contact, only the selected fields need to be loaded
+    :param fields: tuple[str, ...]: Names of the selected fields
+    :return: The JSON document
+    :doc-author: Trelent
+    """
+    return orjson.dumps({name: getattr(contact, name) for name in fields})
+
+
+def dump_contacts(rows: Iterable, fields: tuple[str, ...] = CONTACT_FIELDS) -> bytes:
+    """
+    The dump_contacts function serializes contact rows to a JSON array with orjson,
+    skipping the per-row model validation of response_model=List[ResponseContact].
+
+    :param rows: Iterable: Rows with the selected columns
+    :param fields: tuple[str, ...]: Names of the selected fields
+    :return: The JSON document
+    :doc-author: Trelent
+    """
+    return orjson.dumps([contact_row_to_dict(row, fields) for row in rows])
+
+
+def dump_contact_page(rows: Iterable, next_cursor: str | None, fields: tuple[str, ...] = CONTACT_FIELDS) -> bytes:
+    """
+    The dump_contact_page function serializes a page of contact rows in the ContactPage layout.
+
+    :param rows: Iterable: Rows with the selected columns
+    :param next_cursor: str | None: Cursor of the next page
+    :param fields: tuple[str, ...]: Names of the selected fields
+    :return: The JSON document
+    :doc-author: Trelent
+    """
+    return orjson.dumps({"items": [contact_row_to_dict(row, fields) for row in rows], "next_cursor": next_cursor})
+
+
+def dump_contact_line(row) -> str:
+    """
+    The dump_contact_line function serializes one contact row as a line of newline delimited JSON.
+
+    :param row: A row with the contact columns
+    :return: The JSON line
+    :doc-author: Trelent
+    """
+    return orjson.dumps(contact_row_to_dict(row)).decode("utf-8") + "\n"
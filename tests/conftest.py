@@ -1,11 +1,23 @@
+import os
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+# refresh token families are kept in this process, the tests do not need redis for them
+os.environ.setdefault("REFRESH_TOKEN_STORE", "memory")
+# quotas are counted in this process too, and high enough that only the rate limit tests reach them
+os.environ.setdefault("RATE_LIMIT_STORE", "memory")
+os.environ.setdefault("RATE_LIMITS", '{"*": {"*": "1000/1"}}')
 
 from main import app
 from src.database.models import Base
-from src.database.db import get_db
+from src.database.db import get_db, async_database_url
+from src.services.auth import auth_service
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -15,6 +27,10 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs every request on its own event loop, so async connections are not pooled
+async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -34,13 +50,16 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
+    async def override_get_db():
+        db = AsyncTestingSessionLocal()
         try:
-            yield session
+            yield db
         finally:
-            session.close()
+            await db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    auth_service.local_users.clear()
+    auth_service.token_versions.clear()
 
     yield TestClient(app)
 
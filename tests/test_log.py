@@ -0,0 +1,45 @@
+import logging
+
+import orjson
+import pytest
+
+from src.services.log import request_id, setup_logging
+
+
+@pytest.fixture()
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_json_lines_through_queue(root_logger, capsys):
+    listener = setup_logging("info", {"tests.quiet": "warning"})
+    logger = logging.getLogger("tests.log")
+    token = request_id.set("abc123")
+    try:
+        logger.info("hello %s", "world", extra={"user_id": 7})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+        logging.getLogger("tests.quiet").info("dropped")
+    finally:
+        request_id.reset(token)
+        listener.stop()
+    lines = [orjson.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(lines) == 2
+    assert lines[0]["message"] == "hello world"
+    assert lines[0]["level"] == "INFO"
+    assert lines[0]["logger"] == "tests.log"
+    assert lines[0]["request_id"] == "abc123"
+    assert lines[0]["user_id"] == 7
+    assert "exc_info" not in lines[0]
+    assert lines[1]["message"] == "failed"
+    assert "Traceback" in lines[1]["exc_info"]
+    assert "ValueError: boom" in lines[1]["exc_info"]
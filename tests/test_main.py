@@ -7,4 +7,11 @@ client = TestClient(main.app)
 def test_read_main():
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"message": "REST APP v1.2"}
\ No newline at end of file
+    assert response.json() == {"message": "REST APP v1.2"}
+
+
+def test_request_id_is_returned():
+    response = client.get("/", headers={"X-Request-ID": "abc123"})
+    assert response.headers["X-Request-ID"] == "abc123"
+    response = client.get("/")
+    assert len(response.headers["X-Request-ID"]) == 32
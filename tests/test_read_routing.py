@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User
+from src.services.read_routing import ReadRouting
+
+
+class FakeRedis:
+    def __init__(self):
+        self.keys = {}
+
+    async def set(self, key, value, ex=None):
+        self.keys[key] = (value, ex)
+
+    async def exists(self, key):
+        return int(key in self.keys)
+
+
+class TestReadRouting(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.db = AsyncMock(spec=AsyncSession)
+        self.read_db = AsyncMock(spec=AsyncSession)
+        self.user = User(id=1)
+        self.redis = FakeRedis()
+        self.routing = ReadRouting(5)
+        patcher = patch("src.services.read_routing.auth_service", MagicMock(r=self.redis))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("src.services.read_routing.settings.sqlalchemy_replica_url", "postgresql://replica/db")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_reads_go_to_replica(self):
+        result = await self.routing.get_session(current_user=self.user, db=self.db, read_db=self.read_db)
+        self.assertIs(result, self.read_db)
+
+    async def test_reads_after_write_go_to_primary(self):
+        await self.routing.mark_write(self.user.id)
+        self.assertEqual(self.redis.keys["rw:1"], (1, 5))
+        result = await self.routing.get_session(current_user=self.user, db=self.db, read_db=self.read_db)
+        self.assertIs(result, self.db)
+
+    async def test_other_users_write_keeps_replica(self):
+        await self.routing.mark_write(2)
+        result = await self.routing.get_session(current_user=self.user, db=self.db, read_db=self.read_db)
+        self.assertIs(result, self.read_db)
+
+    async def test_without_replica(self):
+        with patch("src.services.read_routing.settings.sqlalchemy_replica_url", None):
+            await self.routing.mark_write(self.user.id)
+            result = await self.routing.get_session(current_user=self.user, db=self.db, read_db=self.db)
+        self.assertEqual(self.redis.keys, {})
+        self.assertIs(result, self.db)
+
+    async def test_mark_write_redis_down(self):
+        self.redis.set = AsyncMock(side_effect=RedisError)
+        with self.assertLogs("src.services.read_routing", level="WARNING"):
+            await self.routing.mark_write(self.user.id)
+
+    async def test_get_session_redis_down(self):
+        self.redis.exists = AsyncMock(side_effect=RedisError)
+        with self.assertLogs("src.services.read_routing", level="WARNING"):
+            result = await self.routing.get_session(current_user=self.user, db=self.db, read_db=self.read_db)
+        self.assertIs(result, self.db)
+
+
+if __name__ == "__main__":
+    unittest.main()
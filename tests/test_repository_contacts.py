@@ -1,10 +1,13 @@
 import unittest
-from unittest.mock import MagicMock
+from datetime import date, datetime
+from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from src.database.models import Contact, User
-from src.schemas import ContactModel, ContactUpdateModel
+from src.database.models import Base, Contact, User
+from src.schemas import ContactModel, ContactUpdateModel, ContactBatchUpdateItem
+from src.services.pagination import encode_cursor, decode_cursor
 from src.repository.contacts import (
     get_contacts,
     get_contact_by_email,
@@ -14,26 +17,80 @@ from src.repository.contacts import (
     update_contact,
     remove_contact,
     contacts_per_days,
+    stream_contacts,
+    create_contacts_batch,
+    birthday_ordinal,
+    update_contacts_batch,
+    remove_contacts_batch,
+    get_contact_changes,
+    select_columns,
+    contacts_stats,
+    merge_contacts,
+    get_contacts_by_phone,
 )
 
 
 class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
+        patcher = patch("src.repository.contacts.contacts_cache", AsyncMock())
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
         self.user = User(
             id=1, username="Dima", email="test@test.com", password="qwerty"
         )
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact()]
-        self.session.query().filter_by().all.return_value = contacts
-        result = await get_contacts(self.session, self.user)
+        self.result.all.return_value = contacts
+        result, next_cursor = await get_contacts(self.session, self.user)
         self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
 
     async def test_get_contacts_not_found(self):
-        self.session.query().filter_by().all.return_value = None
-        result = await get_contacts(self.session, self.user)
-        self.assertIsNone(result)
+        self.result.all.return_value = []
+        result, next_cursor = await get_contacts(self.session, self.user)
+        self.assertEqual(result, [])
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_next_cursor(self):
+        contacts = [Contact(id=1, lastname="A"), Contact(id=2, lastname="B")]
+        self.result.all.return_value = contacts
+        result, next_cursor = await get_contacts(self.session, self.user, "lastname", None, 1)
+        self.assertEqual(result, contacts[:1])
+        self.assertEqual(decode_cursor(next_cursor, "lastname"), ["A", 1])
+
+    async def test_get_contacts_after_cursor(self):
+        contacts = [Contact(id=3)]
+        self.result.all.return_value = contacts
+        cursor = encode_cursor("id", [2])
+        result, next_cursor = await get_contacts(self.session, self.user, "id", cursor, 10)
+        self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
+
+    def test_select_columns_adds_sort_key(self):
+        columns = select_columns(("id", "firstname"), "lastname")
+        self.assertEqual([column.key for column in columns], ["id", "firstname", "lastname"])
+        columns = select_columns(("id", "lastname"), "lastname")
+        self.assertEqual([column.key for column in columns], ["id", "lastname"])
+
+    async def test_get_contacts_cursor_of_other_sort(self):
+        cursor = encode_cursor("id", [2])
+        with self.assertRaises(ValueError):
+            await get_contacts(self.session, self.user, "lastname", cursor, 10)
+
+    async def test_stream_contacts(self):
+        rows = [(1, "Oleg", "Petrov", "tes@te.com", "123", None)]
+
+        async def stream():
+            for row in rows:
+                yield row
+
+        self.session.stream.return_value = stream()
+        result = [row async for row in stream_contacts(self.session, self.user)]
+        self.assertEqual(result, rows)
 
     async def test_create_contact(self):
         body = ContactModel(
@@ -43,59 +100,338 @@ class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
             phone="12345678",
             birthday=None
         )
+        self.result.scalar_one_or_none.return_value = None
         result = await create_contact(body, self.session, self.user)
         self.assertEqual(result.firstname, body.firstname)
         self.assertEqual(result.birthday, None)
         self.assertTrue(hasattr(result, "id"))
+        self.assertEqual(result.phone_normalized, "12345678")
+        self.session.add.assert_called_once_with(result)
+
+    async def test_create_contact_stores_birthday_as_string(self):
+        body = ContactModel(
+            firstname="Oleg", lastname="Petrov", email="tes@te.com", phone="12345678", birthday=date(1990, 5, 1)
+        )
+        self.result.scalar_one_or_none.return_value = None
+        result = await create_contact(body, self.session, self.user)
+        self.assertEqual(result.birthday, "1990-05-01")
+        self.assertEqual(result.birthday_md, 501)
+
+    async def test_create_contact_revives_deleted(self):
+        body = ContactModel(firstname="Oleg", lastname="Petrov", email="tes@te.com", phone="12345678")
+        contact = Contact(id=5, firstname="Old", deleted_at=datetime(2023, 1, 1))
+        self.result.scalar_one_or_none.return_value = contact
+        result = await create_contact(body, self.session, self.user)
+        self.assertIs(result, contact)
+        self.assertEqual(result.firstname, "Oleg")
+        self.assertIsNone(result.deleted_at)
+        self.session.add.assert_not_called()
+
+    async def test_create_contacts_batch(self):
+        rows = [
+            (2, ContactModel(firstname="Oleg", lastname="Petrov", email="new@te.com", phone="1")),
+            (3, ContactModel(firstname="Ivan", lastname="Petrov", email="old@te.com", phone="2")),
+            (4, ContactModel(firstname="Olga", lastname="Petrova", email="new@te.com", phone="3")),
+            (5, ContactModel(firstname="Anna", lastname="Petrova", email="gone@te.com", phone="4")),
+        ]
+        self.result.all.return_value = [("old@te.com", 9, None), ("gone@te.com", 7, datetime(2023, 1, 1))]
+        inserted, duplicates = await create_contacts_batch(rows, self.session, self.user)
+        self.assertEqual(inserted, [2, 5])
+        self.assertEqual(duplicates, [(3, "old@te.com"), (4, "new@te.com")])
+        self.assertEqual(self.session.execute.await_count, 4)
+        self.session.commit.assert_awaited_once()
+
+    async def test_create_contacts_batch_stores_birthday_as_string(self):
+        body = ContactModel(
+            firstname="Oleg", lastname="Petrov", email="new@te.com", phone="1", birthday=date(1990, 5, 1)
+        )
+        rows = [(2, body)]
+        self.result.all.return_value = []
+        await create_contacts_batch(rows, self.session, self.user)
+        values = self.session.execute.await_args_list[-1].args[1]
+        self.assertEqual(values[0]["birthday"], "1990-05-01")
+        self.assertEqual(values[0]["birthday_md"], 501)
 
     async def test_get_contact_by_filter_firstname(self):
-        contact = Contact()
-        self.session.query().filter_by().all.return_value = contact
-        result = await get_contact_by_filter(self.session, self.user, "Vasya")
-        self.assertEqual(result, contact)
+        contacts = [Contact()]
+        self.result.all.return_value = contacts
+        result, _ = await get_contact_by_filter(self.session, self.user, "Vasya")
+        self.assertEqual(result, contacts)
 
     async def test_get_contact_by_filter_firstname_and_lastname(self):
-        contact = Contact()
-        self.session.query().filter_by().filter_by().all.return_value = contact
-        result = await get_contact_by_filter(self.session, self.user, "Vasya", "Petrov")
-        self.assertEqual(result, contact)
+        contacts = [Contact()]
+        self.result.all.return_value = contacts
+        result, _ = await get_contact_by_filter(self.session, self.user, "Vasya", "Petrov")
+        self.assertEqual(result, contacts)
 
     async def test_get_contact_by_filter_all_query(self):
-        contact = Contact()
-        self.session.query().filter_by().filter_by().filter_by().all.return_value = contact
-        result = await get_contact_by_filter(self.session, self.user, "Vasya", "Petrov", "test@test.com")
-        self.assertEqual(result, contact)
+        contacts = [Contact()]
+        self.result.all.return_value = contacts
+        result, _ = await get_contact_by_filter(self.session, self.user, "Vasya", "Petrov", "test@test.com")
+        self.assertEqual(result, contacts)
 
     async def test_get_contact_by_id(self):
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await get_contact_by_id(1, self.session, self.user)
         self.assertEqual(result, contact)
 
     async def test_get_contact_by_email(self):
         contact = Contact()
-        self.session.query().filter_by().all.return_value = contact
+        self.result.scalars.return_value.all.return_value = contact
         result = await get_contact_by_email("test@test.com", self.session, self.user)
         self.assertEqual(result, contact)
 
     async def test_contacts_per_days(self):
         contact = [Contact(), Contact()]
-        self.session.query().filter().all.return_value = contact
+        self.result.all.return_value = contact
         result = await contacts_per_days(5, self.session, self.user)
         self.assertEqual(result, contact)
 
+    def test_birthday_ordinal(self):
+        self.assertEqual(birthday_ordinal(date(1990, 12, 31)), 1231)
+        self.assertEqual(birthday_ordinal("2000-02-29"), 229)
+        self.assertIsNone(birthday_ordinal(None))
+
     async def test_update_contact(self):
         body = ContactUpdateModel(
             email="test@test.com",
             phone="12346789"
         )
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await update_contact(body, 1, self.session, self.user)
         self.assertEqual(result.phone, body.phone)
+        self.cache.bump.assert_awaited_once_with(self.user.id)
 
     async def test_remove_contact(self):
         contact = Contact()
-        self.session.query().filter_by().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await remove_contact(1, self.session)
         self.assertEqual(result, contact)
+        self.assertIsNotNone(result.deleted_at)
+
+    async def test_get_contact_changes(self):
+        contacts = [
+            Contact(id=1, change_seq=8),
+            Contact(id=2, change_seq=9, deleted_at=datetime(2023, 11, 24, 11, 0)),
+        ]
+        self.result.scalars.return_value.all.return_value = contacts
+        since = encode_cursor("changes", [7, 7])
+        result, next_since, has_more = await get_contact_changes(self.session, self.user, since, 10)
+        self.assertEqual(result, contacts)
+        self.assertEqual(decode_cursor(next_since, "changes"), [9, 2])
+        self.assertFalse(has_more)
+
+    async def test_get_contact_changes_invalid_token(self):
+        for values in ([None, 7], ["2023-11-24T09:00:00", 7]):
+            since = encode_cursor("changes", values)
+            with self.assertRaises(ValueError):
+                await get_contact_changes(self.session, self.user, since, 10)
+
+    async def test_update_contacts_batch(self):
+        items = [
+            ContactBatchUpdateItem(id=1, phone="111"),
+            ContactBatchUpdateItem(id=2, phone="111"),
+            ContactBatchUpdateItem(id=3, email="new@te.com"),
+        ]
+        self.result.scalars.return_value.all.side_effect = [[1], [3]]
+        affected, not_found = await update_contacts_batch(items, self.session, self.user)
+        self.assertEqual(affected, [1, 3])
+        self.assertEqual(not_found, [2])
+        self.assertEqual(self.session.execute.await_count, 3)
+        self.session.commit.assert_awaited_once()
+
+    async def test_remove_contacts_batch(self):
+        self.result.scalars.return_value.all.return_value = [2]
+        affected, not_found = await remove_contacts_batch([2, 5], self.session, self.user)
+        self.assertEqual(affected, [2])
+        self.assertEqual(not_found, [5])
+        self.session.commit.assert_awaited_once()
+        self.cache.bump.assert_awaited_once_with(self.user.id)
+
+    async def test_contacts_stats(self):
+        self.result.scalar_one.return_value = 3
+        self.result.all.side_effect = [[(1, 2), (12, 1)], [("2023-11-20", 3)]]
+        result = await contacts_stats(self.session, self.user.id)
+        self.assertEqual(result["total"], 3)
+        self.assertEqual(result["birthdays_per_month"], [{"month": 1, "count": 2}, {"month": 12, "count": 1}])
+        self.assertEqual(result["added_per_week"], [{"week": "2023-11-20", "count": 3}])
+        self.assertNotIn("per_user", result)
+
+    async def test_contacts_stats_all_users(self):
+        self.result.scalar_one.return_value = 5
+        self.result.all.side_effect = [[], [], [(1, 3), (2, 2)]]
+        result = await contacts_stats(self.session)
+        self.assertEqual(result["per_user"], [{"user_id": 1, "count": 3}, {"user_id": 2, "count": 2}])
+        self.assertEqual(self.session.execute.await_count, 4)
+
+    async def test_merge_contacts(self):
+        primary = Contact(id=1, firstname="Oleg", phone=None, birthday=None)
+        duplicate = Contact(id=2, firstname="Oleh", phone="0501112233", birthday="1990-05-17")
+        self.result.scalars.return_value.all.return_value = [primary, duplicate]
+        contact, merged = await merge_contacts(1, [2, 2, 3], self.session, self.user)
+        self.assertIs(contact, primary)
+        self.assertEqual(merged, [2])
+        self.assertEqual(contact.firstname, "Oleg")
+        self.assertEqual(contact.phone, "0501112233")
+        self.assertEqual(contact.birthday_md, 517)
+        self.assertIsNotNone(duplicate.deleted_at)
+        self.session.commit.assert_awaited_once()
+        self.cache.bump.assert_awaited_once_with(self.user.id)
+
+    async def test_merge_contacts_primary_not_found(self):
+        self.result.scalars.return_value.all.return_value = []
+        contact, merged = await merge_contacts(1, [2], self.session, self.user)
+        self.assertIsNone(contact)
+        self.assertEqual(merged, [])
+        self.session.commit.assert_not_awaited()
+
+    async def test_get_contacts_by_phone(self):
+        contacts = [Contact(id=1, phone="050 111 22 33")]
+        self.result.all.return_value = contacts
+        result = await get_contacts_by_phone("+38 (050) 111-22-33", self.session, self.user)
+        self.assertEqual(result, contacts)
+
+    async def test_get_contacts_by_phone_without_digits(self):
+        result = await get_contacts_by_phone("call me", self.session, self.user)
+        self.assertIsNone(result)
+        self.session.execute.assert_not_awaited()
+
+
+class FrozenDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2023, 12, 29)
+
+
+class TestContactsRepositorySqlite(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(bind=self.engine, expire_on_commit=False)()
+        patcher = patch("src.repository.contacts.contacts_cache", AsyncMock())
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User(id=1, username="Dima", email="test@test.com", password="qwerty")
+        self.other = User(id=2, username="Olga", email="olga@test.com", password="qwerty")
+        self.session.add_all([self.user, self.other])
+        await self.session.commit()
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    def contact(self, email: str, birthday: str | None, user: User = None, **kwargs) -> Contact:
+        return Contact(
+            firstname="Name",
+            lastname="Surname",
+            email=email,
+            phone="123",
+            birthday=birthday,
+            birthday_md=birthday_ordinal(birthday),
+            user_id=(user or self.user).id,
+            **kwargs,
+        )
+
+    async def test_contacts_per_days_across_new_year(self):
+        self.session.add_all([
+            self.contact("jan2@test.com", "1985-01-02"),
+            self.contact("dec31@test.com", "2000-12-31"),
+            self.contact("today@test.com", "1990-12-29"),
+            self.contact("jan10@test.com", "1995-01-10"),
+            self.contact("jun1@test.com", "1990-06-01"),
+            self.contact("dec30@test.com", "1990-12-30"),
+            self.contact("deleted@test.com", "1990-12-30", deleted_at=datetime(2023, 12, 1)),
+            self.contact("other@test.com", "1990-12-30", self.other),
+        ])
+        await self.session.commit()
+        with patch("src.repository.contacts.date", FrozenDate):
+            result = await contacts_per_days(7, self.session, self.user)
+        self.assertEqual(
+            [row.email for row in result], ["dec30@test.com", "dec31@test.com", "jan2@test.com"]
+        )
+
+    async def test_contacts_per_days_within_year(self):
+        self.session.add_all([
+            self.contact("dec31@test.com", "2000-12-31"),
+            self.contact("dec30@test.com", "1990-12-30"),
+            self.contact("jan2@test.com", "1985-01-02"),
+        ])
+        await self.session.commit()
+        with patch("src.repository.contacts.date", FrozenDate):
+            result = await contacts_per_days(1, self.session, self.user)
+        self.assertEqual([row.email for row in result], ["dec30@test.com"])
+
+    async def test_create_contact_revives_own_deleted(self):
+        contact = self.contact("gone@test.com", None)
+        self.session.add(contact)
+        await self.session.commit()
+        await remove_contact(contact.id, self.session)
+        body = ContactModel(firstname="Oleg", lastname="Petrov", email="gone@test.com", phone="1")
+        result = await create_contact(body, self.session, self.user)
+        self.assertEqual(result.id, contact.id)
+        self.assertIsNone(result.deleted_at)
+
+    async def test_create_contact_keeps_other_users_deleted(self):
+        contact = self.contact("gone@test.com", None, updated_at=datetime(2023, 1, 1))
+        self.session.add(contact)
+        await self.session.commit()
+        _, since, _ = await get_contact_changes(self.session, self.user)
+        await remove_contact(contact.id, self.session)
+        body = ContactModel(firstname="Olga", lastname="Petrova", email="gone@test.com", phone="2")
+        result = await create_contact(body, self.session, self.other)
+        self.assertNotEqual(result.id, contact.id)
+        self.assertEqual(result.user_id, self.other.id)
+        changes, _, _ = await get_contact_changes(self.session, self.user, since)
+        self.assertEqual([(row.id, row.user_id) for row in changes], [(contact.id, self.user.id)])
+        self.assertIsNotNone(changes[0].deleted_at)
+
+    async def test_create_contacts_batch_keeps_other_users_deleted(self):
+        contact = self.contact("gone@test.com", None, deleted_at=datetime(2023, 1, 1))
+        self.session.add(contact)
+        await self.session.commit()
+        rows = [(2, ContactModel(firstname="Olga", lastname="Petrova", email="gone@test.com", phone="2"))]
+        inserted, duplicates = await create_contacts_batch(rows, self.session, self.other)
+        self.assertEqual((inserted, duplicates), ([2], []))
+        await self.session.refresh(contact)
+        self.assertEqual(contact.user_id, self.user.id)
+        self.assertIsNotNone(contact.deleted_at)
+        result = await get_contact_by_email("gone@test.com", self.session, self.other)
+        self.assertEqual(len(result), 1)
+        self.assertNotEqual(result[0].id, contact.id)
+
+    async def test_get_contact_changes_in_commit_order(self):
+        first = await create_contact(
+            ContactModel(firstname="A", lastname="A", email="a@test.com", phone="1"), self.session, self.user
+        )
+        _, since, _ = await get_contact_changes(self.session, self.user)
+        second = await create_contact(
+            ContactModel(firstname="B", lastname="B", email="b@test.com", phone="2"), self.session, self.user
+        )
+        # a write whose transaction started before the sync but committed after it has an older timestamp
+        await self.session.execute(
+            update(Contact).where(Contact.id == second.id).values(updated_at=datetime(2000, 1, 1))
+        )
+        await self.session.commit()
+        changes, since, _ = await get_contact_changes(self.session, self.user, since)
+        self.assertEqual([row.id for row in changes], [second.id])
+        changes, _, _ = await get_contact_changes(self.session, self.user, since)
+        self.assertEqual(changes, [])
+        self.assertNotEqual(first.change_seq, second.change_seq)
+
+    async def test_get_contact_changes_pages_one_transaction(self):
+        self.session.add_all([self.contact("a@test.com", None), self.contact("b@test.com", None)])
+        await self.session.commit()
+        _, since, _ = await get_contact_changes(self.session, self.user)
+        affected, _ = await remove_contacts_batch([1, 2], self.session, self.user)
+        self.assertEqual(affected, [1, 2])
+        seen = []
+        for _ in range(2):
+            changes, since, has_more = await get_contact_changes(self.session, self.user, since, 1)
+            seen.extend(row.id for row in changes)
+        self.assertEqual(seen, [1, 2])
+        self.assertFalse(has_more)
+        changes, _, _ = await get_contact_changes(self.session, self.user, since)
+        self.assertEqual(changes, [])
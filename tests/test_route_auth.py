@@ -1,9 +1,12 @@
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from passlib.context import CryptContext
 
 from src.database.models import User
 from src.conf import messages
+from src.services.auth import auth_service
+from src.services.password import password_hasher
 
 
 @pytest.fixture()
@@ -79,6 +82,18 @@ def test_login_user(client, user, session):
     assert payload["token_type"] == "bearer"
 
 
+def test_login_rehashes_password_with_new_cost(client, user, session, monkeypatch):
+    pwd_context = CryptContext(
+        schemes=["bcrypt"], bcrypt__default_rounds=4, bcrypt__min_rounds=4, bcrypt__max_rounds=4
+    )
+    monkeypatch.setattr(password_hasher, "pwd_context", pwd_context)
+    response = client.post("/hw11/auth/login", data={"username": user.get("email"), "password": user.get("password")})
+    assert response.status_code == 200, response.text
+    session.expire_all()
+    current_user: User = session.query(User).filter(User.email == user.get("email")).first()
+    assert current_user.password.startswith("$2b$04$")
+
+
 def test_login_user_with_wrong_password(client, user, session):
     current_user: User = session.query(User).filter(User.email == user.get("email")).first()
     current_user.confirmed = True
@@ -107,6 +122,51 @@ def test_refresh_token(client, user, refresh_token):
     assert response.status_code == 200, response.text
     data = response.json()
     assert "access_token" in data
+    assert auth_service.token_claims.get(auth_service.token_key(refresh_token)) is None
+
+
+def test_refresh_token_reuse_revokes_family(client, user, refresh_token):
+    response = client.get(
+        "/hw11/auth/refresh_token",
+        headers={"Authorization": f"Bearer {refresh_token}"},
+    )
+    assert response.status_code == 200, response.text
+    rotated = response.json()["refresh_token"]
+    response = client.get(
+        "/hw11/auth/refresh_token",
+        headers={"Authorization": f"Bearer {refresh_token}"},
+    )
+    assert response.status_code == 401, response.text
+    response = client.get(
+        "/hw11/auth/refresh_token",
+        headers={"Authorization": f"Bearer {rotated}"},
+    )
+    assert response.status_code == 401, response.text
+
+
+def test_logout_revokes_tokens(client, user):
+    response = client.post("/hw11/auth/login", data={"username": user.get("email"), "password": user.get("password")})
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        redis_mock.zscore.return_value = 1.0
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        response = client.get("/hw11/users/me/", headers=headers)
+        assert response.status_code == 200, response.text
+        redis_mock.zscore.assert_not_called()
+
+        response = client.post("/hw11/auth/logout", headers=headers)
+        assert response.status_code == 204, response.text
+        redis_mock.zadd.assert_called_once()
+
+        response = client.get("/hw11/users/me/", headers=headers)
+        assert response.status_code == 401, response.text
+    response = client.get(
+        "/hw11/auth/refresh_token",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )
+    assert response.status_code == 401, response.text
 
 
 def test_request_email(client, user, access_token):
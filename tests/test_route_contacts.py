@@ -1,9 +1,15 @@
+import asyncio
 from unittest.mock import MagicMock, patch, AsyncMock
 
 import pytest
 
-from src.database.models import User, Contact
+from src.conf.config import settings
+from src.database.models import User, Contact, Role
 from src.services.auth import auth_service
+from src.services.contacts_cache import contacts_cache
+from src.services.principal import Principal, encode_principal
+from src.services.rate_limit import RateLimiter, MemoryRateLimitStore
+from src.services.serialization import CONTACT_FIELDS
 
 CONTACT = {
     "firstname": "string",
@@ -34,11 +40,8 @@ def token(client, user, session, monkeypatch):
 
 
 def test_create_contact(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
         response = client.post(
             "/hw11/contacts/",
             json=CONTACT,
@@ -50,26 +53,39 @@ def test_create_contact(client, token, monkeypatch):
 
 
 def test_get_contacts(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
         response = client.get(
             "/hw11/contacts/", headers={"Authorization": f"Bearer {token}"}
         )
         assert response.status_code == 200, response.text
         data = response.json()
-        assert type(data) == list
-        assert data[0]["firstname"] == CONTACT["firstname"]
+        assert type(data["items"]) == list
+        assert data["items"][0]["firstname"] == CONTACT["firstname"]
+        assert data["next_cursor"] is None
+
+
+def test_get_contacts_sparse_fields(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get(
+            "/hw11/contacts/",
+            params={"fields": "firstname,lastname", "sort": "lastname"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert set(data["items"][0]) == {"id", "firstname", "lastname"}
+
+        response = client.get(
+            "/hw11/contacts/", params={"fields": "password"}, headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 400, response.text
 
 
 def test_get_contact_by_id(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
         response = client.get(
             "/hw11/contacts/contact/1", headers={"Authorization": f"Bearer {token}"}
         )
@@ -80,11 +96,8 @@ def test_get_contact_by_id(client, token, monkeypatch):
 
 
 def test_get_contact_by_id_not_found(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
         response = client.get(
             "/hw11/contacts/contact/100", headers={"Authorization": f"Bearer {token}"}
         )
@@ -94,11 +107,8 @@ def test_get_contact_by_id_not_found(client, token, monkeypatch):
 
 
 def test_update_contact(client, token, monkeypatch, session):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-        monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock())
         response = client.patch(
             "/hw11/contacts/1",
             json={"email": "ex@ex.com", "phone": "12345"},
@@ -116,3 +126,271 @@ def test_update_contact(client, token, monkeypatch, session):
         assert response.status_code == 200, response.text
         data = response.json()
         assert data["email"] == "ex@ex.com"
+
+
+def test_export_contacts_csv(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get(
+            "/hw11/contacts/export",
+            params={"format": "csv"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0] == "id,firstname,lastname,email,phone,birthday"
+        assert len(lines) == 2
+
+
+def test_import_contacts(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        content = (
+            "firstname,lastname,email,phone,birthday\n"
+            "Oleg,Petrov,oleg@example.com,123,1990-05-01\n"
+            "Ivan,Petrov,ex@ex.com,456,\n"
+            "Olga,Petrova,not-an-email,789,\n"
+        )
+        response = client.post(
+            "/hw11/contacts/import",
+            files={"file": ("contacts.csv", content, "text/csv")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 1
+        assert [row["line"] for row in data["duplicates"]] == [3]
+        assert [row["line"] for row in data["invalid"]] == [4]
+
+
+def test_import_contacts_in_chunks(client, token, monkeypatch):
+    monkeypatch.setattr("src.services.contacts_io.IMPORT_CHUNK_SIZE", 7)
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        content = (
+            "\ufefffirstname,lastname,email,phone,birthday\r\n"
+            '"Анна","Ко, \r\nваль",anna@chunks.com,123,\r\n'
+            "Petro,Ivanenko,petro@chunks.com,456,1991-02-03"
+        ).encode("utf-8")
+        response = client.post(
+            "/hw11/contacts/import",
+            files={"file": ("contacts.csv", content, "text/csv")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 2
+        assert data["invalid"] == []
+        assert data["duplicates"] == []
+
+
+def test_import_contacts_not_utf8(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        content = (
+            "firstname,lastname,email,phone,birthday\n"
+            "Анна,Коваль,anna@cp1251.com,123,\n"
+        ).encode("cp1251") + b"Petro,Ivanenko,petro@cp1251.com,456,\n"
+        response = client.post(
+            "/hw11/contacts/import",
+            files={"file": ("contacts.csv", content, "text/csv")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 1
+        assert data["invalid"] == [{"line": 2, "detail": "Line is not valid UTF-8"}]
+
+
+def test_import_contacts_stray_quotes(client, token, monkeypatch):
+    monkeypatch.setattr("src.services.contacts_io.IMPORT_MAX_RECORD_LINES", 3)
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        content = (
+            "firstname,lastname,email,phone,birthday\n"
+            'Ol"ga,Petrova,olga@quotes.com,123,\n'
+            '"Ivan,Petrov,ivan@quotes.com,456,\n'
+            "Anna,Koval,anna@quotes.com,789,\n"
+            "Oksana,Koval,oksana@quotes.com,789,\n"
+            "Petro,Ivanenko,petro@quotes.com,101,\n"
+        )
+        response = client.post(
+            "/hw11/contacts/import",
+            files={"file": ("contacts.csv", content, "text/csv")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 2
+        assert data["invalid"] == [{"line": 3, "detail": "Unterminated quoted value"}]
+
+
+def test_get_contacts_not_modified(client, token, user, monkeypatch):
+    async def redis_get(key):
+        return b"7" if key.startswith("contacts:ver:") else None
+
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.side_effect = redis_get
+        name = contacts_cache.key("page", None, None, None, "id", None, 50, ",".join(CONTACT_FIELDS))
+        etag = contacts_cache.etag(user["id"], 7, name)
+        response = client.get(
+            "/hw11/contacts/",
+            headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+        )
+        assert response.status_code == 304, response.text
+        assert response.headers["etag"] == etag
+
+
+def test_get_contact_if_none_match_any(client, token, monkeypatch):
+    async def redis_get(key):
+        return b"7" if key.startswith("contacts:ver:") else None
+
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.side_effect = redis_get
+        headers = {"Authorization": f"Bearer {token}", "If-None-Match": "*"}
+        response = client.get("/hw11/contacts/contact/99999", headers=headers)
+        assert response.status_code == 404, response.text
+        response = client.post(
+            "/hw11/contacts/",
+            json={**CONTACT, "email": "any@example.com"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        contact_id = response.json()["id"]
+        response = client.get(f"/hw11/contacts/contact/{contact_id}", headers=headers)
+        assert response.status_code == 304, response.text
+
+
+def test_get_contacts_stats(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get(
+            "/hw11/contacts/stats", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["total"] >= 1
+        assert 11 in [row["month"] for row in data["birthdays_per_month"]]
+        assert "per_user" not in data
+
+
+def test_get_contacts_stats_all_forbidden(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get(
+            "/hw11/contacts/stats/all", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 403, response.text
+
+
+def test_find_and_merge_duplicates(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        ids = []
+        for firstname, email, phone in (
+            ("Taras", "taras@dup.com", "+38 (050) 111-22-33"),
+            ("Zenon", "zenon@dup.com", "0501112233"),
+        ):
+            response = client.post(
+                "/hw11/contacts/",
+                json={**CONTACT, "firstname": firstname, "email": email, "phone": phone},
+                headers=headers,
+            )
+            assert response.status_code == 201, response.text
+            ids.append(response.json()["id"])
+
+        response = client.get("/hw11/contacts/duplicates", headers=headers)
+        assert response.status_code == 200, response.text
+        groups = [[contact["id"] for contact in group] for group in response.json()["groups"]]
+        assert any(set(ids) <= set(group) for group in groups)
+
+        response = client.post(
+            "/hw11/contacts/merge", json={"primary_id": ids[0], "duplicate_ids": [ids[1]]}, headers=headers
+        )
+        assert response.status_code == 200, response.text
+        assert response.json()["merged"] == [ids[1]]
+        response = client.get(f"/hw11/contacts/contact/{ids[1]}", headers=headers)
+        assert response.status_code == 404, response.text
+
+
+def test_get_contacts_by_phone(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.post(
+            "/hw11/contacts/",
+            json={**CONTACT, "email": "caller@phone.com", "phone": "+38 (067) 765-43-21"},
+            headers=headers,
+        )
+        assert response.status_code == 201, response.text
+
+        response = client.get("/hw11/contacts/by-phone/067-765-43-21", headers=headers)
+        assert response.status_code == 200, response.text
+        assert [contact["email"] for contact in response.json()] == ["caller@phone.com"]
+
+        response = client.get("/hw11/contacts/by-phone/0000000", headers=headers)
+        assert response.status_code == 404, response.text
+
+
+def test_get_contacts_with_cached_principal(client, token, user, monkeypatch):
+    principal = Principal(user["id"], user["email"], user["username"], Role.user, True, None)
+
+    async def redis_get(key):
+        return encode_principal(principal) if key == f"user:{user['email']}" else None
+
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.side_effect = redis_get
+        response = client.get(
+            "/hw11/contacts/", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        cached_keys = [call.args[0] for call in redis_mock.set.call_args_list]
+        assert f"user:{user['email']}" not in cached_keys
+
+
+def test_get_contacts_with_claims_token(client, token, user, monkeypatch):
+    monkeypatch.setattr(settings, "stateless_access_tokens", True)
+    auth_service.local_users.clear()
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        redis_mock.incr.return_value = 1
+        response = client.post(
+            "/hw11/auth/login",
+            data={"username": user.get("email"), "password": user.get("password")},
+        )
+        claims_token = response.json()["access_token"]
+        assert auth_service.decode_token(claims_token)["ver"] == 0
+
+        response = client.get(
+            "/hw11/contacts/", headers={"Authorization": f"Bearer {claims_token}"}
+        )
+        assert response.status_code == 200, response.text
+        requested_keys = [call.args[0] for call in redis_mock.get.call_args_list]
+        assert f"user:{user['email']}" not in requested_keys
+
+        asyncio.run(auth_service.bump_token_version(user["id"]))
+        response = client.get(
+            "/hw11/contacts/", headers={"Authorization": f"Bearer {claims_token}"}
+        )
+        assert response.status_code == 401, response.text
+    auth_service.token_versions.clear()
+
+
+def test_rate_limit_per_role(client, token, monkeypatch):
+    limiter = RateLimiter(MemoryRateLimitStore(), {"*": {"*": "2/60", "admin": "20/60"}}, 100)
+    monkeypatch.setattr("src.services.rate_limit.rate_limiter", limiter)
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("/hw11/contacts/", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["RateLimit-Limit"] == "2"
+        assert response.headers["RateLimit-Remaining"] == "1"
+        response = client.get("/hw11/contacts/", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.headers["RateLimit-Remaining"] == "0"
+        response = client.get("/hw11/contacts/", headers=headers)
+        assert response.status_code == 429, response.text
+        assert int(response.headers["Retry-After"]) > 0
+        assert limiter.quota("get_contacts", Role.admin.value) == (20, 60.0)
@@ -0,0 +1,50 @@
+from unittest.mock import MagicMock, patch, AsyncMock
+
+import pytest
+
+from src.database.models import User, Role
+from src.services.auth import auth_service
+
+
+@pytest.fixture()
+def token(client, user, session, monkeypatch):
+    mock_send_email = MagicMock()
+    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    client.post("/hw11/auth/signup", json=user)
+
+    current_user: User = (
+        session.query(User).filter(User.email == user.get("email")).first()
+    )
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/hw11/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+    )
+    data = response.json()
+    return data["access_token"]
+
+
+def test_metrics_require_authentication(client):
+    response = client.get("/hw11/metrics/db-pool")
+    assert response.status_code == 401, response.text
+
+
+def test_metrics_forbidden_for_user(client, token):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        for path in ("db-pool", "contacts-cache", "user-cache"):
+            response = client.get(f"/hw11/metrics/{path}", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 403, response.text
+
+
+def test_metrics_for_admin(client, token, user, session):
+    current_user: User = session.query(User).filter(User.email == user.get("email")).first()
+    current_user.role = Role.admin
+    session.commit()
+    auth_service.local_users.clear()
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/hw11/metrics/user-cache", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert "hits" in response.json()
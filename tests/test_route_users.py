@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock, patch, AsyncMock
+
+import pytest
+
+from src.conf.config import settings
+from src.database.models import User, Role
+from src.services.auth import auth_service
+
+
+@pytest.fixture()
+def token(client, user, session, monkeypatch):
+    mock_send_email = MagicMock()
+    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    client.post("/hw11/auth/signup", json=user)
+
+    current_user: User = (
+        session.query(User).filter(User.email == user.get("email")).first()
+    )
+    current_user.confirmed = True
+    session.commit()
+    response = client.post(
+        "/hw11/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+    )
+    data = response.json()
+    return data["access_token"]
+
+
+def test_revoke_sessions_forbidden_for_user(client, token, user):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.post(
+            f"/hw11/users/{user['id']}/revoke_sessions", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 403, response.text
+        redis_mock.incr.assert_not_called()
+
+
+def test_revoke_sessions_not_found(client, token, user, session):
+    current_user: User = session.query(User).filter(User.email == user.get("email")).first()
+    current_user.role = Role.admin
+    session.commit()
+    auth_service.local_users.clear()
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.post("/hw11/users/99999/revoke_sessions", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 404, response.text
+        redis_mock.incr.assert_not_called()
+
+
+def test_revoke_sessions(client, user, monkeypatch):
+    monkeypatch.setattr(settings, "stateless_access_tokens", True)
+    auth_service.local_users.clear()
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        redis_mock.incr.return_value = 1
+        response = client.post(
+            "/hw11/auth/login",
+            data={"username": user.get("email"), "password": user.get("password")},
+        )
+        tokens = response.json()
+        assert auth_service.decode_token(tokens["refresh_token"])["ver"] == 0
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+        response = client.post(f"/hw11/users/{user['id']}/revoke_sessions", headers=headers)
+        assert response.status_code == 204, response.text
+        redis_mock.incr.assert_called_once_with(f"user:token_version:{user['id']}")
+
+        response = client.get("/hw11/contacts/", headers=headers)
+        assert response.status_code == 401, response.text
+        response = client.get(
+            "/hw11/auth/refresh_token",
+            headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+        )
+        assert response.status_code == 401, response.text
+    auth_service.token_versions.clear()